@@ -0,0 +1,93 @@
+import csv
+import json
+import zlib
+from collections import OrderedDict
+
+from models import bodies_serial
+
+
+def isoformats(timestamps):
+    return [timestamp.isoformat() for timestamp in timestamps]
+
+
+# column name -> (values_list field, how to write out a chunk of its values)
+COLUMNS = {
+    "pk": ("pk", None),
+    "timestamp": ("timestamp", isoformats),
+    "author": ("author__username", None),
+    "body": ("body", None),
+    "body_serial": ("body", bodies_serial),
+}
+DEFAULT_COLUMNS = ("pk", "timestamp", "author", "body")
+
+
+def iter_rows(queryset, columns=DEFAULT_COLUMNS, after_pk=None, chunk_size=1000):
+    """
+    Yields one tuple per message, in pk order, holding at most chunk_size rows at a time.
+    """
+    fields = ["pk"] + [COLUMNS[column][0] for column in columns]
+    queryset = queryset.order_by("pk")
+    last = after_pk
+    while True:
+        chunk = queryset
+        if last is not None:
+            chunk = chunk.filter(pk__gt=last)
+        rows = list(chunk.values_list(*fields)[:chunk_size].iterator())
+        if not rows: return
+        last = rows[-1][0]
+        values = zip(*rows)[1:]
+        values = [
+            vector if convert is None else convert(vector)
+            for ((field, convert), vector)
+            in zip([COLUMNS[column] for column in columns], values)
+        ]
+        for row in zip(*values):
+            yield row
+        if len(rows) < chunk_size: return
+
+
+def jsonl_lines(rows, columns):
+    for row in rows:
+        yield json.dumps(OrderedDict(zip(columns, row))) + "\n"
+
+
+class LineBuffer(object):
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, columns):
+    writer = csv.writer(LineBuffer())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([
+            value.encode("utf-8") if isinstance(value, unicode) else value
+            for value
+            in row
+        ])
+
+
+FORMATS = {
+    "jsonl": (jsonl_lines, "application/x-ndjson"),
+    "csv": (csv_lines, "text/csv"),
+}
+
+
+def batched(lines, size=256):
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch: yield "".join(batch)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if isinstance(chunk, unicode):
+            chunk = chunk.encode("utf-8")
+        compressed = compressor.compress(chunk)
+        if compressed: yield compressed
+    yield compressor.flush()
@@ -0,0 +1,211 @@
+"""
+Loads messages written by chat.export back in, a batch per transaction.
+"""
+import csv
+import gzip
+import json
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from models import ChatMessage, UserStats, compute_body_preview, insert_as_given
+from signals import messages_imported
+from versions import bump_log_version
+
+
+def jsonl_records(lines):
+    for line in lines:
+        line = line.strip()
+        if line: yield json.loads(line)
+
+
+def csv_records(lines):
+    reader = csv.reader(lines)
+    columns = next(reader, None)
+    for row in reader:
+        yield dict(zip(columns, [value.decode("utf-8") for value in row]))
+
+
+FORMATS = {
+    "jsonl": jsonl_records,
+    "csv": csv_records,
+}
+
+
+def open_lines(path):
+    if path.endswith(".gz"): return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def upload_lines(upload):
+    if upload.name.endswith(".gz"): return gzip.GzipFile(fileobj=upload, mode="rb")
+    return upload
+
+
+def format_for(name, default="jsonl"):
+    """
+    The format a file name says it holds, e.g. messages.csv.gz -> csv.
+    """
+    for format in FORMATS:
+        if name.endswith("." + format) or name.endswith(".%s.gz" % format):
+            return format
+    return default
+
+
+def chunked(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk: yield chunk
+
+
+def parse_pk(value):
+    if value in (None, ""): return None
+    return int(value) or None
+
+
+def parse_timestamp(value):
+    if not value: raise ValueError("every row needs a timestamp")
+    moment = parse_datetime(value)
+    if moment is None: raise ValueError("not a datetime: %r" % value)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.get_current_timezone())
+    return moment
+
+
+def body_from_serial(serial):
+    return u"".join([("\\U%08x" % int(n, 16)).decode("unicode-escape") for n in serial.split()])
+
+
+def record_body(record):
+    if "body" in record: return record["body"] or u""
+    if "body_serial" in record: return body_from_serial(record["body_serial"])
+    raise ValueError("rows need a body or body_serial column")
+
+
+class Authors(object):
+    """
+    Username -> user pk, looked up a batch at a time and remembered.
+    Unknown usernames are an error unless create is set.
+    """
+    def __init__(self, create=False):
+        self.create = create
+        self.pks = {}
+
+    def resolve(self, names):
+        User = get_user_model()
+        missing = set(name for name in names if name and name not in self.pks)
+        if missing:
+            self.pks.update(User.objects.filter(username__in=missing).values_list("username", "pk"))
+            missing -= set(self.pks)
+        if missing and not self.create:
+            raise ValueError("unknown authors: %s" % ", ".join(sorted(missing)))
+        for name in missing:
+            user = User(username=name)
+            user.set_unusable_password()
+            user.save()
+            self.pks[name] = user.pk
+
+    def __getitem__(self, name):
+        if not name: return None
+        return self.pks[name]
+
+
+class Numbering(object):
+    """
+    Whether an import's rows come with pks. Rows without one are given new
+    pks, which a later row's own pk could then land on and be skipped as
+    taken, so one import has to be all one or all the other.
+    """
+    def __init__(self):
+        self.numbered = None
+
+    def check(self, objs):
+        for obj in objs:
+            numbered = obj.pk is not None
+            if self.numbered is None:
+                self.numbered = numbered
+            elif numbered != self.numbered:
+                raise ValueError("rows with and without pks can't be mixed in one import")
+
+
+class Progress(object):
+    def __init__(self):
+        self.imported = 0
+        self.skipped = 0
+        self.started = time.time()
+
+    def rate(self):
+        elapsed = time.time() - self.started
+        return self.imported / elapsed if elapsed > 0 else 0.0
+
+    def as_dict(self):
+        return {"imported": self.imported, "skipped": self.skipped, "rate": round(self.rate(), 1)}
+
+    def __str__(self):
+        return "%d imported, %d skipped, %.0f rows/s" % (self.imported, self.skipped, self.rate())
+
+
+def import_messages(records, batch_size=1000, create_authors=False, report=None):
+    """
+    Inserts messages, given as export rows (dicts), batch_size at a time, each
+    batch in its own transaction and with the author and timestamp as given.
+    Rows whose pk is already taken are skipped, so running an interrupted
+    import again picks up where it stopped. Rows without a pk are numbered
+    on from the largest pk, and can't be mixed with rows that have one.
+    Calls report(progress) after every batch, and returns the Progress.
+    """
+    authors = Authors(create_authors)
+    numbering = Numbering()
+    progress = Progress()
+    for records in chunked(records, batch_size):
+        authors.resolve([record.get("author") for record in records])
+        messages = []
+        for record in records:
+            body = record_body(record)
+            messages.append(ChatMessage(
+                pk=parse_pk(record.get("pk")),
+                body=body,
+                body_preview=compute_body_preview(body),
+                timestamp=parse_timestamp(record.get("timestamp")),
+                author_id=authors[record.get("author")],
+            ))
+        numbering.check(messages)
+        pks = [message.pk for message in messages if message.pk is not None]
+        taken = set(ChatMessage.objects.filter(pk__in=pks).values_list("pk", flat=True)) if pks else set()
+        messages = [message for message in messages if message.pk not in taken]
+        with transaction.commit_on_success():
+            # bulk inserts don't report the pks they get, so rows without one get theirs here
+            unnumbered = [message for message in messages if message.pk is None]
+            if unnumbered:
+                start = ChatMessage.objects.aggregate(last=Max("pk"))["last"] or 0
+                for (offset, message) in enumerate(unnumbered):
+                    message.pk = start + offset + 1
+            insert_as_given(ChatMessage, messages)
+            # recounted on next view, rather than a row at a time here
+            authored = set(message.author_id for message in messages) - set([None])
+            UserStats.objects.filter(user__in=authored).delete()
+            messages_imported.send(sender=ChatMessage, messages=messages)
+            reset_sequences(ChatMessage)
+        bump_log_version()
+        progress.imported += len(messages)
+        progress.skipped += len(taken)
+        if report is not None: report(progress)
+    return progress
+
+
+def reset_sequences(*models):
+    """
+    Moves the pk sequences past the imported pks, where the database has them.
+    """
+    cursor = connection.cursor()
+    for sql in connection.ops.sequence_reset_sql(no_style(), models):
+        cursor.execute(sql)
@@ -0,0 +1,42 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import transaction
+
+from chat.models import ChatMessage, compute_body_preview
+
+
+class Command(NoArgsCommand):
+    help = "Stores the body preview of every message saved before previews were stored."
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            "--all",
+            action="store_true",
+            dest="all",
+            default=False,
+            help="Recompute every preview, not only the empty ones.",
+        ),
+        make_option(
+            "--batch-size",
+            type="int",
+            dest="batch_size",
+            default=1000,
+        ),
+    )
+
+    def handle_noargs(self, **options):
+        messages = ChatMessage.objects.order_by("pk")
+        if not options["all"]:
+            messages = messages.filter(body_preview="").exclude(body="")
+        last = 0
+        updated = 0
+        while True:
+            batch = list(messages.filter(pk__gt=last).values_list("pk", "body")[:options["batch_size"]])
+            if not batch: break
+            last = batch[-1][0]
+            with transaction.commit_on_success():
+                for (pk, body) in batch:
+                    preview = compute_body_preview(body)
+                    ChatMessage.objects.filter(pk=pk).update(body_preview=preview)
+            updated += len(batch)
+            self.stdout.write("%d previews stored" % updated)
@@ -0,0 +1,14 @@
+from django.core.management.base import NoArgsCommand, CommandError
+from django.db import connection, transaction
+
+from chat import search
+
+
+class Command(NoArgsCommand):
+    help = "Recreates the full-text search index over every message body."
+
+    def handle_noargs(self, **options):
+        with transaction.commit_on_success():
+            if not search.create_index(connection.cursor()):
+                raise CommandError("This database has no FTS5 support; search uses substring matching.")
+        self.stdout.write("Rebuilt the search index.")
@@ -0,0 +1,17 @@
+from django.core.management.base import NoArgsCommand
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from chat.models import UserStats
+
+
+class Command(NoArgsCommand):
+    help = "Recounts every user's message stats from scratch."
+
+    def handle_noargs(self, **options):
+        with transaction.commit_on_success():
+            UserStats.objects.all().delete()
+            users = User.objects.filter(chatmessage__isnull=False).distinct()
+            for user in users:
+                UserStats.objects.aggregate_for(user).save()
+        self.stdout.write("Recounted stats for %d users." % len(users))
@@ -1,37 +1,125 @@
-from django.db import models
+import json
+from contextlib import contextmanager
+
+from django.db import models, transaction, connection
+from django.conf import settings
 from django.core.urlresolvers import reverse
 from cuser.fields import CurrentUserField
+from cuser.middleware import CuserMiddleware
+
+from versions import bump_log_version
+from signals import message_committed
+
+
+PREVIEW_LENGTH = 64
+PREVIEW_CHARACTERS = frozenset(u" abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ.0123456789,-_:/")
+HEX = ["%X" % n for n in range(256)]
+
+
+@contextmanager
+def keeping_authors():
+    """
+    CurrentUserField overwrites author with the request's user on every insert,
+    bulk_create included; inside this block it keeps the authors as they were set.
+    Yields the user it would have used.
+    """
+    user = CuserMiddleware.get_user()
+    CuserMiddleware.del_user()
+    try:
+        yield user
+    finally:
+        if user is not None: CuserMiddleware.set_user(user)
+
+
+def insert_as_given(model, objs):
+    """
+    bulk_create without the pre_save hooks, as loaddata's raw saves do:
+    auto_now_add timestamps, CurrentUserField authors and pks go in as set.
+    """
+    manager = model._base_manager
+    batch_size = max(connection.ops.bulk_batch_size(model._meta.local_fields, objs), 1)
+    with_pk = [obj for obj in objs if obj.pk is not None]
+    without_pk = [obj for obj in objs if obj.pk is None]
+    for (batch, fields) in (
+        (with_pk, model._meta.local_fields),
+        (without_pk, [field for field in model._meta.local_fields if not isinstance(field, models.AutoField)]),
+    ):
+        for start in range(0, len(batch), batch_size):
+            manager._insert(batch[start:start + batch_size], fields=fields, raw=True, using=manager.db)
+
+
+def body_codepoints(body):
+    return map(ord, unicode(body))
+
+
+def bodies_serial(bodies):
+    """
+    body_serial for a whole batch of bodies, e.g. a chunk of an export.
+    """
+    hexes = HEX
+    return [
+        " ".join([hexes[n] if n < 256 else "%X" % n for n in map(ord, unicode(body))])
+        for body
+        in bodies
+    ]
+
+
+def body_serial(body):
+    return bodies_serial([body])[0]
+
+
+def compute_body_preview(body):
+    #ASCII-safe
+    safe = []
+    for c in unicode(body):
+        if c == u"\n": c = u" "
+        if c in PREVIEW_CHARACTERS:
+            safe.append(c)
+            if len(safe) == PREVIEW_LENGTH: break
+    return str("".join(safe))
 
 
 class ChatMessageExportMixin(object):
     def get_body_codepoints(self):
-        u = unicode(self.body)
-        return [ord(point) for point in u]
+        return body_codepoints(self.body)
 
     def get_body_serial(self):
-        codepoints = self.get_body_codepoints()
-        hexpoints = ["%X" % n for n in codepoints]
-        return " ".join(hexpoints)
+        return body_serial(self.body)
 
     def get_body_preview(self):
-        #ASCII-safe
-        points = self.get_body_codepoints()
-        if not points: return points
-        points_no_linebreaks = [p if p != '\n' else ' ' for p in points]
-        whitelist = [ord(c) for c in " abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ.0123456789,-_:/"]
-        safepoints = [
-            p
-            for p
-            in points_no_linebreaks
-            if p < 256 and p in whitelist
-        ]
-        return "".join([chr(c) for c in safepoints])[:64]
+        preview = getattr(self, "body_preview", None)
+        if preview or not self.body: return preview or ""
+        return compute_body_preview(self.body)
 
 
 class ChatMessage(ChatMessageExportMixin, models.Model):
     body = models.TextField(blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     author = CurrentUserField(add_only=True)
+    body_preview = models.CharField(max_length=PREVIEW_LENGTH, blank=True, db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.body_preview = compute_body_preview(self.body)
+        created = self.pk is None
+        with transaction.commit_on_success():
+            old = None
+            if self.pk is not None:
+                old = ChatMessage.objects.filter(pk=self.pk).values_list("author", "body")
+                old = old[0] if old else None
+            result = super(ChatMessage, self).save(*args, **kwargs)
+            if old is not None:
+                UserStats.objects.count_message(old[0], old[1], -1)
+            UserStats.objects.count_message(self.author_id, self.body, 1)
+        bump_log_version()
+        message_committed.send(sender=ChatMessage, instance=self, created=created)
+        return result
+
+    def delete(self, *args, **kwargs):
+        with transaction.commit_on_success():
+            UserStats.objects.count_message(self.author_id, self.body, -1)
+            result = super(ChatMessage, self).delete(*args, **kwargs)
+        bump_log_version()
+        return result
 
     def get_absolute_url(self):
         return reverse('message_detail', kwargs={'pk': self.pk})
@@ -39,3 +127,88 @@ class ChatMessage(ChatMessageExportMixin, models.Model):
     def get_author_url(self):
         author = self.author
         return reverse("user_detail", kwargs={"pk": author.pk})
+
+
+def tracked_phrases():
+    return list(getattr(settings, "CHAT_TRACKED_PHRASES", ("HILY", "HGWILY")))
+
+
+def is_todo(body):
+    return "todo" in body.lower()
+
+
+class UserStatsManager(models.Manager):
+    def count_message(self, user, body, sign):
+        """
+        Adds (sign=1) or takes away (sign=-1) one message from its author's stats.
+        Authors without an up-to-date row are left for stats_for to recount.
+        """
+        if user is None: return
+        stats = list(self.select_for_update().filter(user=user))
+        if not stats or stats[0].is_stale(): return
+        stats = stats[0]
+        stats.message_count += sign
+        if is_todo(body): stats.todo_count += sign
+        counts = stats.get_phrase_counts()
+        for phrase in counts:
+            if phrase in body: counts[phrase] += sign
+        stats.set_phrase_counts(counts)
+        stats.save()
+
+    def aggregate_for(self, user):
+        """
+        Counts everything in one pass over the user's messages.
+        """
+        phrases = tracked_phrases()
+        if connection.vendor == "sqlite":
+            contains = "instr(body, %s) > 0"
+        else:
+            contains = "POSITION(%s IN body) > 0"
+        columns = ["COUNT(*)", "SUM(CASE WHEN UPPER(body) LIKE %s THEN 1 ELSE 0 END)"]
+        columns += ["SUM(CASE WHEN %s THEN 1 ELSE 0 END)" % contains for phrase in phrases]
+        cursor = connection.cursor()
+        cursor.execute(
+            "SELECT %s FROM %s WHERE author_id = %%s" % (", ".join(columns), ChatMessage._meta.db_table),
+            ["%TODO%"] + phrases + [user.pk],
+        )
+        row = [n or 0 for n in cursor.fetchone()]
+        stats = self.model(user=user, message_count=row[0], todo_count=row[1])
+        stats.set_phrase_counts(dict(zip(phrases, row[2:])))
+        return stats
+
+    def stats_for(self, user):
+        """
+        The user's stats row, recounted and stored first if it's missing or stale.
+        """
+        stats = list(self.filter(user=user))
+        if stats and not stats[0].is_stale(): return stats[0]
+        with transaction.commit_on_success():
+            stats = self.aggregate_for(user)
+            stats.save()
+        return stats
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, primary_key=True, related_name="chat_stats")
+    message_count = models.PositiveIntegerField(default=0)
+    todo_count = models.PositiveIntegerField(default=0)
+    # JSON object from each tracked phrase to the number of messages containing it
+    phrase_counts = models.TextField(default="{}")
+
+    objects = UserStatsManager()
+
+    def get_phrase_counts(self):
+        return json.loads(self.phrase_counts)
+
+    def set_phrase_counts(self, counts):
+        self.phrase_counts = json.dumps(counts)
+
+    def is_stale(self):
+        """
+        True if the tracked phrases have changed since these were counted.
+        """
+        return set(self.get_phrase_counts()) != set(tracked_phrases())
+
+    def get_phrase_count_list(self):
+        counts = self.get_phrase_counts()
+        return [(phrase, counts[phrase]) for phrase in tracked_phrases()]
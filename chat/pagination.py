@@ -0,0 +1,115 @@
+import base64
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404
+from django.utils import timezone
+
+
+if settings.USE_TZ:
+    EPOCH = datetime.datetime(1970, 1, 1, tzinfo=timezone.utc)
+else:
+    EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def encode_cursor(timestamp, pk):
+    delta = timestamp - EPOCH
+    microseconds = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return base64.urlsafe_b64encode("%d.%d" % (microseconds, pk)).rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    Returns (timestamp, pk), or raises ValueError for a token we didn't make.
+    """
+    try:
+        token = str(token)
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        microseconds, pk = [int(part) for part in raw.split(".")]
+    except (TypeError, UnicodeError):
+        raise ValueError("bad cursor %r" % token)
+    return EPOCH + datetime.timedelta(microseconds=microseconds), pk
+
+
+class KeysetPage(object):
+    """
+    Quacks enough like django.core.paginator.Page for the list templates,
+    but knows only its neighbours' cursors, not its number or the total count.
+    """
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginationMixin(object):
+    """
+    For ListViews over models with a timestamp.
+    Pages by (timestamp, pk) with ?after= and ?before= cursors,
+    so every page costs the same as the first and nothing gets counted.
+    ?page=N still gets the plain paginator, for old links.
+    """
+    keyset_descending = True
+
+    def keyset_filter(self, queryset, token, forwards):
+        try:
+            timestamp, pk = decode_cursor(token)
+        except ValueError:
+            raise Http404("Invalid cursor.")
+        if forwards == self.keyset_descending:
+            query = Q(timestamp__lt=timestamp) | Q(timestamp=timestamp, pk__lt=pk)
+        else:
+            query = Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk)
+        return queryset.filter(query)
+
+    def keyset_order(self, queryset, forwards):
+        if forwards == self.keyset_descending:
+            return queryset.order_by("-timestamp", "-pk")
+        return queryset.order_by("timestamp", "pk")
+
+    def paginate_queryset(self, queryset, page_size):
+        if "page" in self.request.GET:
+            return super(KeysetPaginationMixin, self).paginate_queryset(queryset, page_size)
+        after = self.request.GET.get("after")
+        before = self.request.GET.get("before")
+        forwards = before is None
+        token = after if forwards else before
+        if token is not None:
+            queryset = self.keyset_filter(queryset, token, forwards)
+        rows = list(self.keyset_order(queryset, forwards)[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+        if not forwards: rows.reverse()
+        if forwards:
+            has_next, has_previous = more, token is not None
+        else:
+            # we came back from the page after this one
+            has_next, has_previous = True, more
+        next_cursor = previous_cursor = None
+        if rows and has_next:
+            next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].pk)
+        if rows and has_previous:
+            previous_cursor = encode_cursor(rows[0].timestamp, rows[0].pk)
+        page = KeysetPage(rows, next_cursor, previous_cursor)
+        return (None, page, rows, page.has_other_pages())
+
+    def get_context_data(self, **kwargs):
+        context = super(KeysetPaginationMixin, self).get_context_data(**kwargs)
+        context["keyset_paginated"] = isinstance(context.get("page_obj"), KeysetPage)
+        return context
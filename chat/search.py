@@ -0,0 +1,129 @@
+import re
+
+from django.db import connection
+
+from models import ChatMessage
+
+
+FTS_TABLE = "chat_chatmessage_fts"
+
+CREATE_TABLE_SQL = """
+    CREATE VIRTUAL TABLE chat_chatmessage_fts
+    USING fts5(body, content='chat_chatmessage', content_rowid='id')
+"""
+
+# keeps the index in step with chat_chatmessage, however the rows get written
+TRIGGER_SQL = (
+    """
+    CREATE TRIGGER chat_chatmessage_fts_insert AFTER INSERT ON chat_chatmessage BEGIN
+        INSERT INTO chat_chatmessage_fts(rowid, body) VALUES (new.id, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_chatmessage_fts_delete AFTER DELETE ON chat_chatmessage BEGIN
+        INSERT INTO chat_chatmessage_fts(chat_chatmessage_fts, rowid, body) VALUES ('delete', old.id, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_chatmessage_fts_update AFTER UPDATE OF body ON chat_chatmessage BEGIN
+        INSERT INTO chat_chatmessage_fts(chat_chatmessage_fts, rowid, body) VALUES ('delete', old.id, old.body);
+        INSERT INTO chat_chatmessage_fts(rowid, body) VALUES (new.id, new.body);
+    END
+    """,
+)
+
+DROP_TRIGGER_SQL = (
+    "DROP TRIGGER IF EXISTS chat_chatmessage_fts_insert",
+    "DROP TRIGGER IF EXISTS chat_chatmessage_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_chatmessage_fts_update",
+)
+DROP_TABLE_SQL = "DROP TABLE IF EXISTS chat_chatmessage_fts"
+
+REBUILD_SQL = "INSERT INTO chat_chatmessage_fts(chat_chatmessage_fts) VALUES ('rebuild')"
+
+
+def fts_supported(cursor):
+    if connection.vendor != "sqlite": return False
+    cursor.execute("PRAGMA compile_options")
+    return ("ENABLE_FTS5",) in [tuple(row) for row in cursor.fetchall()]
+
+
+def create_index(cursor):
+    """
+    Creates the index and its triggers, then fills it.
+    Does nothing where SQLite lacks FTS5; search then falls back to substring matching.
+    """
+    if not fts_supported(cursor): return False
+    drop_index(cursor)
+    cursor.execute(CREATE_TABLE_SQL)
+    cursor.execute(REBUILD_SQL)
+    create_triggers(cursor)
+    return True
+
+
+def drop_index(cursor):
+    if connection.vendor != "sqlite": return
+    for sql in DROP_TRIGGER_SQL:
+        cursor.execute(sql)
+    cursor.execute(DROP_TABLE_SQL)
+
+
+def create_triggers(cursor):
+    """
+    South remakes chat_chatmessage to alter it on SQLite, which drops the triggers;
+    migrations that do that call this afterwards.
+    """
+    if not index_exists(cursor): return
+    for sql in DROP_TRIGGER_SQL + TRIGGER_SQL:
+        cursor.execute(sql)
+
+
+def index_exists(cursor):
+    if connection.vendor != "sqlite": return False
+    cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+        [FTS_TABLE],
+    )
+    return cursor.fetchone() is not None
+
+
+_enabled = []
+def fts_enabled():
+    if _enabled: return True
+    if not index_exists(connection.cursor()): return False
+    _enabled.append(True)
+    return True
+
+
+def fts_query(text):
+    """
+    Turns what the user typed into an FTS5 query:
+    every word has to appear, as a word or the start of one.
+    """
+    words = re.findall(r"\w+", text, re.UNICODE)
+    return " ".join('"%s"*' % word for word in words)
+
+
+def search(text, offset=0, limit=20):
+    """
+    Returns up to limit messages matching text, best match first.
+    """
+    if not text:
+        qs = ChatMessage.objects.order_by("-timestamp", "-pk")
+        return list(qs.select_related("author")[offset:offset + limit])
+    if not fts_enabled():
+        qs = ChatMessage.objects.filter(body__icontains=text).order_by("-timestamp", "-pk")
+        return list(qs.select_related("author")[offset:offset + limit])
+    match = fts_query(text)
+    if not match: return []
+    cursor = connection.cursor()
+    cursor.execute(
+        "SELECT rowid FROM %s WHERE %s MATCH %%s ORDER BY rank, rowid DESC LIMIT %%s OFFSET %%s" % (
+            FTS_TABLE,
+            FTS_TABLE,
+        ),
+        [match, limit, offset],
+    )
+    pks = [row[0] for row in cursor.fetchall()]
+    messages = ChatMessage.objects.select_related("author").in_bulk(pks)
+    return [messages[pk] for pk in pks if pk in messages]
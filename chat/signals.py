@@ -0,0 +1,10 @@
+from django.dispatch import Signal
+
+
+# Sent by ChatMessage.save once its transaction has committed, unlike
+# post_save, which comes before.
+message_committed = Signal(providing_args=["instance", "created"])
+
+# Sent by chat.importer inside the transaction of each batch it inserts,
+# since bulk inserts send no post_save.
+messages_imported = Signal(providing_args=["messages"])
@@ -7,6 +7,7 @@ from chat.views import (
     MessageListView,
     MessageDetailView,
     MessageExportView,
+    MessageStreamExportView,
     UserDetailView,
     MessageSearchView,
 )
@@ -50,6 +51,13 @@ urlpatterns = patterns(
         ),
         name='message_export',
     ),
+    url(
+        r'^message/export/stream/(?P<format>jsonl|csv)/$',
+        login_required(
+            MessageStreamExportView.as_view()
+        ),
+        name='message_export_stream',
+    ),
 
     url(
         r'^user/(?P<pk>\d+)/$',
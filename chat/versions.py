@@ -0,0 +1,56 @@
+import time
+
+from django.core.cache import cache
+
+
+TIMEOUT = 60 * 60 * 24 * 30
+
+def version_key(name):
+    return "version:%s" % name
+
+
+def initial_version():
+    # counters start from the clock, so one that gets evicted from the cache
+    # comes back higher than any value it had before
+    return int(time.time() * 1000000)
+
+
+def get_version(name):
+    key = version_key(name)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, initial_version(), TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(name):
+    # incr is atomic on memcached, but on the file and local-memory caches it
+    # is a read and then a write: two processes bumping at once can both land
+    # on the same number, and whatever was cached under it after the first
+    # write then outlives the second. Use memcached for CACHES["default"]
+    # where writes from several processes can coincide.
+    key = version_key(name)
+    try:
+        return cache.incr(key)
+    except ValueError: # not in the cache
+        cache.add(key, initial_version(), TIMEOUT)
+        return get_version(name)
+
+
+def get_versions(names):
+    """
+    The version of each name, in one cache fetch.
+    """
+    cached = cache.get_many([version_key(name) for name in names])
+    return [cached.get(version_key(name)) or get_version(name) for name in names]
+
+LOG = "chat.log"
+
+def log_version():
+    return get_version(LOG)
+
+
+def bump_log_version():
+    # after the write commits, so whoever sees the new version can read it
+    return bump_version(LOG)
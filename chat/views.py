@@ -1,4 +1,7 @@
+import datetime
+
 from django.views.generic import (
+    View,
     TemplateView,
     CreateView,
     ListView,
@@ -7,8 +10,15 @@ from django.views.generic import (
 )
 from django.core.urlresolvers import reverse
 from django.contrib.auth.models import User
-from models import ChatMessage
+from django.http import StreamingHttpResponse, HttpResponseBadRequest
+from django.utils.dateparse import parse_datetime, parse_date
+from django.utils import timezone
+from models import ChatMessage, UserStats
 from forms import MessageSearchForm
+from pagination import KeysetPaginationMixin
+from conditional import WatermarkMixin
+import search
+import export
 
 
 class PageTitleMixin(object):
@@ -43,7 +53,7 @@ class MessageCreateView(PageTitleMixin, CreateView):
         return super(MessageCreateView, self).get_success_url()
 
 
-class MessageListView(PageTitleMixin, ListView):
+class MessageListView(WatermarkMixin, KeysetPaginationMixin, PageTitleMixin, ListView):
     model = ChatMessage
     page_title = 'Message log'
     paginate_by = 20
@@ -57,7 +67,7 @@ class MessageDetailView(PageTitleMixin, DetailView):
     model = ChatMessage
     page_title = 'Message details'
 
-class MessageExportView(ListView):
+class MessageExportView(WatermarkMixin, KeysetPaginationMixin, ListView):
     model = ChatMessage
     paginate_by = 64
     template_name = "chat/chatmessage_list.html"
@@ -68,21 +78,89 @@ class MessageExportView(ListView):
         return result + fallbacks
 
 
+def parse_moment(value, name="moment"):
+    """
+    A date or datetime from a query string, made aware; None for none.
+    """
+    if not value: return None
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None: raise ValueError("%s: not a date or datetime: %r" % (name, value))
+        moment = datetime.datetime.combine(day, datetime.time())
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment, timezone.get_current_timezone())
+    return moment
+
+
+class MessageStreamExportView(View):
+    """
+    The whole log (or a date range or one author's part of it) as JSON Lines or CSV.
+    ?after=<pk> resumes an interrupted export, ?gzip=1 compresses it on the fly.
+    """
+    def parse_moment(self, name):
+        return parse_moment(self.request.GET.get(name), name)
+
+    def get(self, request, *args, **kwargs):
+        format = self.kwargs["format"]
+        lines, content_type = export.FORMATS[format]
+        columns = request.GET.get("columns")
+        columns = columns.split(",") if columns else export.DEFAULT_COLUMNS
+        qs = ChatMessage.objects.all()
+        try:
+            unknown = [column for column in columns if column not in export.COLUMNS]
+            if unknown: raise ValueError("unknown columns: %s" % ", ".join(unknown))
+            since = self.parse_moment("since")
+            until = self.parse_moment("until")
+            after = request.GET.get("after")
+            after = int(after) if after else None
+        except ValueError as e:
+            return HttpResponseBadRequest(unicode(e), content_type="text/plain")
+        if since is not None: qs = qs.filter(timestamp__gte=since)
+        if until is not None: qs = qs.filter(timestamp__lt=until)
+        if request.GET.get("author"):
+            qs = qs.filter(author__username=request.GET["author"])
+        rows = export.iter_rows(qs, columns, after_pk=after)
+        content = export.batched(lines(rows, columns))
+        filename = "messages.%s" % format
+        if request.GET.get("gzip"):
+            content = export.gzipped(content)
+            content_type = "application/gzip"
+            filename += ".gz"
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response["Content-Disposition"] = 'attachment; filename="%s"' % filename
+        return response
+
+
 class UserDetailView(PageTitleMixin, DetailView):
     model = User
+    # TODO posts shown per page; the counts come from UserStats
+    todo_paginate_by = 10
 
     def get_page_title(self):
         return 'Details for user "%s"' % self.get_object()
 
     def get_context_data(self, **kwargs):
         context = super(UserDetailView, self).get_context_data(**kwargs)
-        user_messages = self.get_object().chatmessage_set.all()
+        user = self.get_object()
+        stats = UserStats.objects.stats_for(user)
+        try:
+            todo_page = max(1, int(self.request.GET.get('todo_page', 1)))
+        except ValueError:
+            todo_page = 1
+        offset = (todo_page - 1) * self.todo_paginate_by
+        todos = user.chatmessage_set.filter(body__icontains='TODO').order_by('-timestamp', '-pk')
+        todos = list(todos[offset:offset + self.todo_paginate_by + 1])
+        if todo_page > 1:
+            context['todo_previous_page'] = todo_page - 1
+        if len(todos) > self.todo_paginate_by:
+            context['todo_next_page'] = todo_page + 1
         context.update(
             {
-                'todo_messages': user_messages.filter(body__icontains='TODO'),
-                'message_count': user_messages.count(),
-                'HILY_count': user_messages.filter(body__contains='HILY').count(),
-                'HGWILY_count': user_messages.filter(body__contains='HGWILY').count(),
+                'todo_messages': todos[:self.todo_paginate_by],
+                'message_count': stats.message_count,
+                'todo_count': stats.todo_count,
+                'phrase_counts': stats.get_phrase_count_list(),
             }
         )
         return context
@@ -92,21 +170,46 @@ class MessageSearchView(PageTitleMixin, FormView):
     form_class = MessageSearchForm
     page_title = 'Message search'
     template_name = 'chat/message_search.html'
+    paginate_by = 20
 
     def __init__(self):
         super(MessageSearchView, self).__init__()
-        self.qs = ChatMessage.objects.none()
+        self.results = None
+        self.page_number = 1
+        self.has_next = False
+
+    def get_initial(self):
+        initial = super(MessageSearchView, self).get_initial()
+        initial['body_substring'] = self.request.GET.get('body_substring', '')
+        return initial
+
+    def get_page_query(self, number):
+        query = self.request.GET.copy()
+        query['page'] = number
+        return query.urlencode()
 
     def get(self, request, *args, **kwargs):
         if 'search' in request.GET:
-            self.qs = ChatMessage.objects.all() # yay monkeypatching
-            substr = request.GET.get('body_substring')
-            if substr:  # could be ''
-                self.qs = self.qs.filter(body__icontains=substr)
-            self.qs = self.qs.order_by('-timestamp')
-        return super(MessageSearchView, self).get(self, request, *args, **kwargs)
+            try:
+                self.page_number = max(1, int(request.GET.get('page', 1)))
+            except ValueError:
+                self.page_number = 1
+            found = search.search(
+                request.GET.get('body_substring', ''), # could be ''
+                offset=(self.page_number - 1) * self.paginate_by,
+                limit=self.paginate_by + 1,
+            )
+            self.results = found[:self.paginate_by]
+            self.has_next = len(found) > self.paginate_by
+        return super(MessageSearchView, self).get(request, *args, **kwargs)
 
     def get_context_data(self, **kwargs):
         context = super(MessageSearchView, self).get_context_data(**kwargs)
-        context['qs'] = self.qs
+        context['searched'] = self.results is not None
+        context['results'] = self.results or []
+        context['page_number'] = self.page_number
+        if self.page_number > 1:
+            context['previous_query'] = self.get_page_query(self.page_number - 1)
+        if self.has_next:
+            context['next_query'] = self.get_page_query(self.page_number + 1)
         return context
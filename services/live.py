@@ -0,0 +1,194 @@
+"""
+Live updates for the Today and untagged pages, as Server-Sent Events.
+
+Runs beside the WSGI app, as its own process under Python 3.7 or later
+(it uses asyncio and never imports Django). It lives outside the telelogue
+package, which is Python 2.7, so that nothing there compiles or imports it:
+
+    python3 services/live.py --port 8765 --broker-port 8766
+
+with LIVE_BROKER = ("127.0.0.1", 8766) and
+LIVE_EVENTS_URL = "http://<host>:8765/events" in the settings.
+The app (transit.live) sends each event as a JSON datagram to the broker
+port; every browser connected to /events?only=<types> gets the ones it
+asked for. Events carry only pks, and the pages fetch the rows from
+/transit/feed/, so the stream itself needs no login.
+
+Each subscriber keeps at most QUEUE_SIZE undelivered events. One that
+falls further behind loses the oldest and gets a "resync" event instead,
+so a slow client costs bounded memory and never holds up anyone else.
+"""
+import argparse
+import asyncio
+import json
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+
+QUEUE_SIZE = 64
+HEARTBEAT = 15 # seconds; keeps proxies from closing idle streams
+WRITE_BUFFER = 16 * 1024
+REQUEST_TIMEOUT = 10
+
+
+class Subscriber:
+    def __init__(self, only=None, size=QUEUE_SIZE):
+        self.only = only
+        self.events = deque(maxlen=size)
+        self.lagged = False
+        self.ready = asyncio.Event()
+
+    def offer(self, event):
+        if self.only is not None and event.get("type") not in self.only: return
+        if len(self.events) == self.events.maxlen:
+            self.lagged = True # the deque drops the oldest
+        self.events.append(event)
+        self.ready.set()
+
+    async def take(self, timeout):
+        """
+        Returns (events, lagged): everything waiting, after up to timeout
+        seconds for something, and whether any was dropped.
+        """
+        if not self.events:
+            try:
+                await asyncio.wait_for(self.ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        self.ready.clear()
+        events, lagged = list(self.events), self.lagged
+        self.events.clear()
+        self.lagged = False
+        return events, lagged
+
+
+class Hub:
+    """
+    Fans events out to the subscribers. publish() never blocks, so the
+    broker and tests can call it straight from the event loop.
+    """
+    def __init__(self):
+        self.subscribers = set()
+
+    def subscribe(self, only=None):
+        subscriber = Subscriber(only)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event):
+        for subscriber in list(self.subscribers):
+            subscriber.offer(event)
+
+
+class BrokerProtocol(asyncio.DatagramProtocol):
+    def __init__(self, hub):
+        self.hub = hub
+
+    def datagram_received(self, data, address):
+        try:
+            event = json.loads(data.decode("utf-8"))
+        except ValueError:
+            return
+        if isinstance(event, dict):
+            self.hub.publish(event)
+
+
+def encode_event(event):
+    return ("event: %s\ndata: %s\n\n" % (event.get("type", "message"), json.dumps(event))).encode("utf-8")
+
+
+def response_head(status, headers=()):
+    lines = ["HTTP/1.1 %s" % status] + ["%s: %s" % header for header in headers]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+class EventStreamServer:
+    def __init__(self, hub, allow_origin="*", heartbeat=HEARTBEAT):
+        self.hub = hub
+        self.allow_origin = allow_origin
+        self.heartbeat = heartbeat
+
+    async def read_request(self, reader):
+        """
+        Returns the request's method and target, skipping its headers.
+        """
+        request_line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+        while True:
+            line = await asyncio.wait_for(reader.readline(), REQUEST_TIMEOUT)
+            if line in (b"\r\n", b"\n", b""): break
+        parts = request_line.decode("latin-1").split()
+        if len(parts) < 2: return None, None
+        return parts[0], parts[1]
+
+    async def handle(self, reader, writer):
+        writer.transport.set_write_buffer_limits(high=WRITE_BUFFER)
+        try:
+            method, target = await self.read_request(reader)
+            url = urlsplit(target or "")
+            if method != "GET" or url.path != "/events":
+                writer.write(response_head("404 Not Found", [("Content-Length", "0"), ("Connection", "close")]))
+                await writer.drain()
+                return
+            only = parse_qs(url.query).get("only")
+            only = set(",".join(only).split(",")) if only else None
+            writer.write(response_head("200 OK", [
+                ("Content-Type", "text/event-stream"),
+                ("Cache-Control", "no-cache"),
+                ("Connection", "keep-alive"),
+                ("Access-Control-Allow-Origin", self.allow_origin),
+            ]))
+            writer.write(b"retry: 5000\n\n")
+            await self.stream(self.hub.subscribe(only), writer)
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def stream(self, subscriber, writer):
+        try:
+            while True:
+                events, lagged = await subscriber.take(self.heartbeat)
+                if lagged:
+                    writer.write(encode_event({"type": "resync"}))
+                for event in events:
+                    writer.write(encode_event(event))
+                if not events and not lagged:
+                    writer.write(b": ping\n\n")
+                # waits while this client's socket is backed up; meanwhile
+                # its queue takes (and, past QUEUE_SIZE, sheds) new events
+                await writer.drain()
+        finally:
+            self.hub.unsubscribe(subscriber)
+
+
+async def start(hub, host, port, broker_port=None, allow_origin="*"):
+    """
+    Starts serving hub's events on (host, port), and fills hub from the
+    broker port if one is given. Returns the server.
+    """
+    if broker_port is not None:
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: BrokerProtocol(hub), local_addr=("127.0.0.1", broker_port))
+    return await asyncio.start_server(EventStreamServer(hub, allow_origin).handle, host, port, backlog=1024)
+
+
+async def serve(options):
+    server = await start(Hub(), options.host, options.port, options.broker_port, options.allow_origin)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serves live updates to telelogue's pages.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--broker-port", type=int, default=8766)
+    parser.add_argument("--allow-origin", default="*")
+    asyncio.run(serve(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -139,6 +139,42 @@ INSTALLED_APPS = (
 
 SESSION_SERIALIZER = 'django.contrib.sessions.serializers.JSONSerializer'
 
+# Phrases whose per-user message counts show up on the user page.
+CHAT_TRACKED_PHRASES = ('HILY', 'HGWILY')
+
+# Shared by every worker process on this host.
+# Point this at memcached if the app ever runs on more than one host, or
+# under concurrent writes: the version counters (chat/versions.py) rely on
+# incr, which only memcached does atomically.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': '/var/tmp/telelogue_cache',
+    },
+    # Rendered message previews (transit/fragments.py), kept apart so that
+    # thousands of them never evict the default cache's version counters.
+    # Per process; the file backend counts its files on every set, which
+    # doesn't scale to this many entries. MAX_ENTRIES covers many full pages.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'telelogue-fragments',
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
+}
+
+# Serve message previews from the fragment cache, in the views that don't set
+# cache_previews themselves. manage.py benchmark_views times the pages both ways.
+CACHE_PREVIEWS = False
+
+# Live updates (services/live.py, under Python 3). LIVE_BROKER is where the app sends its
+# events: the service's (host, port), 'inprocess' for tests, or None for off.
+# LIVE_EVENTS_URL is where browsers find the event stream.
+LIVE_BROKER = None
+LIVE_EVENTS_URL = None
+
 # A sample logging configuration. The only tangible logging
 # performed by this configuration is to send an email to
 # the site admins on every HTTP 500 error when DEBUG=False.
@@ -0,0 +1,208 @@
+"""
+Times the main chat and transit pages through the test client, each on a
+fresh test database filled by transit.synthetic at several sizes, and
+compares the numbers with a stored baseline.
+
+For every page and size it records the median wall time of a few warm
+requests, their query count, and how far the first (cold) request raised
+the peak RSS. Each page is measured in a child forked for it, whose peak
+starts from nothing, rather than from whatever generating the data took.
+A page whose query count grows with the data fails as well. The pages
+that can serve previews from the fragment cache are timed both with
+settings.CACHE_PREVIEWS off and, as "<page>+previews", on.
+"""
+import json
+import os
+import resource
+import time
+
+from django.conf import settings
+from django.core.urlresolvers import reverse
+from django.db import connection
+from django.contrib.auth import get_user_model
+from django.test.client import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from chat.versions import bump_log_version
+from . import synthetic
+from .caching import bump_graph_version
+from .models import PARAMETERS_PER_QUERY
+
+
+PAGES = (
+    ("today", lambda dataset: reverse("today")),
+    ("untagged", lambda dataset: reverse("untagged_messages")),
+    # the bottom of the first deep thread
+    ("message_detail", lambda dataset: reverse("transit_message_detail", args=[dataset.message_pk(dataset.thread_depth - 1)])),
+    ("reply", lambda dataset: reverse("reply", kwargs={"parent": dataset.message_pk(dataset.count // 2)})),
+    ("search", lambda dataset: reverse("message_search") + "?search=1&body_substring=deploy"),
+    ("user_detail", lambda dataset: reverse("user_detail", kwargs={"pk": dataset.user.pk})),
+)
+# the pages whose views take CachedPreviewsMixin
+PREVIEW_PAGES = ("today", "untagged", "message_detail", "reply")
+TOLERANCE = 1.5
+# wall times and peaks this small are noise, not regressions
+SLACK_MS = 5.0
+SLACK_KB = 2048
+
+
+def peak_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2: return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def in_child(function, *args):
+    """
+    Calls function(*args) in a forked child, which shares the test database
+    and exits without closing it, and returns the result, sent back as JSON.
+    """
+    (read, write) = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        try:
+            result = {"value": function(*args)}
+        except Exception as e:
+            result = {"error": "%s: %s" % (type(e).__name__, e)}
+        with os.fdopen(write, "w") as f:
+            json.dump(result, f)
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as f:
+        result = f.read()
+    os.waitpid(pid, 0)
+    if not result:
+        raise RuntimeError("the child measuring %r died" % (args,))
+    result = json.loads(result)
+    if "error" in result:
+        raise ValueError(result["error"])
+    return result["value"]
+
+
+def measure(client, url, repeat, cache_previews=False):
+    with override_settings(CACHE_PREVIEWS=cache_previews):
+        before = peak_kb()
+        response = client.get(url)
+        if response.status_code != 200:
+            raise ValueError("%s answered %d" % (url, response.status_code))
+        grown = peak_kb() - before
+        times = []
+        for _ in range(repeat):
+            connection.queries[:] = []
+            started = time.time()
+            client.get(url)
+            times.append(time.time() - started)
+    return {
+        "ms": round(median(times) * 1000, 2),
+        "queries": len(connection.queries),
+        "peak_kb": grown,
+    }
+
+
+def logged_in_client(dataset):
+    User = get_user_model()
+    dataset.user = User.objects.get(username=dataset.usernames[0])
+    dataset.user.set_password("benchmark")
+    dataset.user.save()
+    client = Client()
+    client.login(username=dataset.user.username, password="benchmark")
+    return client
+
+
+def forget_cached():
+    """
+    The cache is shared with whatever database was in use before, so moving
+    between databases moves the versions on, as a write to either would.
+    """
+    bump_log_version()
+    bump_graph_version()
+
+
+def run(sizes, repeat=5, report=None, **options):
+    """
+    Returns {"<page>@<size>": {"ms": ..., "queries": ..., "peak_kb": ...}}.
+    options go to synthetic.generate.
+    """
+    # south's migrations build the test databases, FTS index included
+    from south.management.commands import patch_for_test_db_setup
+    patch_for_test_db_setup()
+    setup_test_environment()
+    debug_cursor = connection.use_debug_cursor
+    connection.use_debug_cursor = True
+    results = {}
+    try:
+        for size in sizes:
+            old_name = settings.DATABASES["default"]["NAME"]
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            forget_cached()
+            try:
+                dataset = synthetic.generate(messages=size, **options)
+                client = logged_in_client(dataset)
+                for (page, url) in PAGES:
+                    for cache_previews in (False, True) if page in PREVIEW_PAGES else (False,):
+                        key = "%s%s@%d" % (page, "+previews" if cache_previews else "", size)
+                        results[key] = in_child(measure, client, url(dataset), repeat, cache_previews)
+                        if report is not None: report(key, results[key])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                forget_cached()
+    finally:
+        connection.use_debug_cursor = debug_cursor
+        teardown_test_environment()
+    return results
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Lists how results fall behind baseline: any extra query, or a wall time
+    or peak more than tolerance times the baseline's (plus a little slack).
+    Pages and sizes missing from the baseline are skipped.
+    """
+    regressions = []
+    for key in sorted(results):
+        if key not in baseline: continue
+        result, expected = results[key], baseline[key]
+        if result["queries"] > expected["queries"]:
+            regressions.append("%s: %d queries, baseline %d" % (key, result["queries"], expected["queries"]))
+        if result["ms"] > expected["ms"] * tolerance + SLACK_MS:
+            regressions.append("%s: %.1f ms, baseline %.1f" % (key, result["ms"], expected["ms"]))
+        if result["peak_kb"] > expected["peak_kb"] * tolerance + SLACK_KB:
+            regressions.append("%s: peak +%d KB, baseline +%d" % (key, result["peak_kb"], expected["peak_kb"]))
+    return regressions
+
+
+def query_growth(results):
+    """
+    Lists the pages whose query count rises from one size to the next by
+    more than a query per PARAMETERS_PER_QUERY messages added: that is a
+    query per row somewhere, whatever the baseline says. Less is key_chunks()
+    splitting the bulk lookups of a page that shows more rows with more data.
+    """
+    sizes = {}
+    for (key, result) in results.items():
+        (page, size) = key.rsplit("@", 1)
+        sizes.setdefault(page, []).append((int(size), result["queries"]))
+    growth = []
+    for page in sorted(sizes):
+        counts = sorted(sizes[page])
+        for ((small, fewer), (large, more)) in zip(counts, counts[1:]):
+            if more - fewer > (large - small) // PARAMETERS_PER_QUERY:
+                growth.append("%s: %d queries at %d messages, %d at %d" % (page, fewer, small, more, large))
+    return growth
+
+
+def load_baseline(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results):
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True, separators=(",", ": "))
+        f.write("\n")
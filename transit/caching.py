@@ -0,0 +1,42 @@
+from django.core.cache import cache
+
+from chat.versions import get_version, bump_version
+
+
+GRAPH = "transit.graph"
+
+
+def graph_version():
+    return get_version(GRAPH)
+
+
+def bump_graph_version():
+    return bump_version(GRAPH)
+
+
+def semantics_key(version):
+    return "transit.semantics:%s" % version
+
+
+def get_cached_semantics(version):
+    """
+    Returns the cached {name: message or None} map for version, or None.
+    """
+    return cache.get(semantics_key(version))
+
+
+def cache_semantics(resolved, version):
+    # one key per version, so that a graph write adds one entry, not one per name
+    cache.set(semantics_key(version), resolved)
+
+
+def naturals_key(version):
+    return "transit.naturals:%s" % version
+
+
+def get_cached_naturals(version):
+    return cache.get(naturals_key(version))
+
+
+def cache_naturals(chain, version):
+    cache.set(naturals_key(version), chain)
@@ -0,0 +1,97 @@
+"""
+What was written after a client's cursor, for clients that poll instead of
+reloading whole pages. A cursor holds the log and graph versions it was made
+at, so a poll while nothing has been written costs two cache reads.
+"""
+import time
+from collections import OrderedDict, namedtuple
+from itertools import islice
+
+from django.db.models import Max
+
+from chat import export
+from chat.models import ChatMessage
+from chat.versions import log_version
+from .caching import graph_version
+from .models import Triple
+
+
+MESSAGE_COLUMNS = export.DEFAULT_COLUMNS
+TRIPLE_FIELDS = ("pk", "source", "path", "destination", "author__username", "timestamp")
+TRIPLE_COLUMNS = ("pk", "source", "path", "destination", "author", "timestamp")
+
+
+class Cursor(namedtuple("Cursor", "log graph message triple")):
+    """
+    The versions last seen, and the last message and triple pks sent.
+    A version of 0 means "don't trust the versions, go and look".
+    """
+    def __str__(self):
+        return "%d.%d.%d.%d" % self
+
+
+def parse_cursor(token):
+    try:
+        return Cursor(*[int(part) for part in token.split(".")])
+    except (TypeError, ValueError):
+        raise ValueError("bad cursor %r" % token)
+
+
+def versions():
+    return (log_version(), graph_version())
+
+
+def head():
+    """
+    A cursor for now, with nothing older left to send.
+    """
+    log, graph = versions()
+    message = ChatMessage.objects.aggregate(last=Max("pk"))["last"] or 0
+    triple = Triple.objects.aggregate(last=Max("pk"))["last"] or 0
+    return Cursor(log, graph, message, triple)
+
+
+def quiet(cursor):
+    return versions() == (cursor.log, cursor.graph)
+
+
+def wait(cursor, timeout, interval=0.5):
+    """
+    Sleeps until something is written after cursor or timeout seconds pass;
+    returns whether anything was.
+    """
+    deadline = time.time() + timeout
+    while quiet(cursor):
+        remaining = deadline - time.time()
+        if remaining <= 0: return False
+        time.sleep(min(interval, remaining))
+    return True
+
+
+def changes(cursor, limit=100):
+    """
+    Returns (messages, triples, next cursor): what was created after cursor,
+    oldest first, at most limit of each.
+    """
+    if quiet(cursor): return [], [], cursor
+    # read before the rows, so a write landing in between is seen next time
+    log, graph = versions()
+    rows = export.iter_rows(ChatMessage.objects.all(), MESSAGE_COLUMNS, after_pk=cursor.message, chunk_size=limit + 1)
+    messages = list(islice(rows, limit + 1))
+    triples = Triple.objects.filter(pk__gt=cursor.triple).order_by("pk")
+    triples = list(triples.values_list(*TRIPLE_FIELDS)[:limit + 1])
+    if len(messages) > limit or len(triples) > limit:
+        log = graph = 0
+        messages, triples = messages[:limit], triples[:limit]
+    next_cursor = Cursor(
+        log,
+        graph,
+        messages[-1][MESSAGE_COLUMNS.index("pk")] if messages else cursor.message,
+        triples[-1][0] if triples else cursor.triple,
+    )
+    triples = [row[:-1] + (row[-1].isoformat(),) for row in triples]
+    return (
+        [OrderedDict(zip(MESSAGE_COLUMNS, row)) for row in messages],
+        [OrderedDict(zip(TRIPLE_COLUMNS, row)) for row in triples],
+        next_cursor,
+    )
@@ -0,0 +1,92 @@
+"""
+Rendered message previews, cached under a stamp of everything the template
+reads from the message and the page: its hide, sticky, tag and parent edges
+(as annotated by the view), the bodies it shows, and the viewer. A triple
+write that changes what a preview shows changes its stamp, so there is
+nothing to invalidate; stale fragments just age out.
+
+They live in a cache of their own (CACHES["fragments"]), so a page's worth
+of them can't push the version counters, the semantic map or the hit
+counters out of the default cache.
+"""
+import hashlib
+
+from django.core.cache import cache, get_cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+
+TEMPLATE = "transit/_message_preview.html"
+TIMEOUT = 60 * 60 * 24
+HITS = "transit.previews.hits"
+MISSES = "transit.previews.misses"
+PAGE_CONTEXT = ("hide_pk", "sticky_pk", "this_page")
+previews = get_cache("fragments")
+
+
+def described(value):
+    """
+    (pk, preview) of an annotated message, or of the "a reply" stand-in for a tag.
+    """
+    if value is None: return None
+    if isinstance(value, dict):
+        return (value.get("pk"), value.get("get_body_preview"))
+    return (value.pk, value.get_body_preview())
+
+
+def preview_stamp(message, context):
+    user = context.get("user")
+    values = (
+        message.pk,
+        message.timestamp,
+        message.author_id,
+        message.body,
+        user is not None and user.pk == message.author_id,
+        described(getattr(message, "hide", None)),
+        getattr(message, "sticky", None) is not None,
+        described(getattr(message, "tag", None)),
+        described(getattr(message, "parent", None)),
+        getattr(message, "reply_count", None),
+        tuple(context.get(name) for name in PAGE_CONTEXT),
+    )
+    return hashlib.md5(repr(values)).hexdigest()
+
+
+def preview_key(message, context):
+    return "transit.preview:%d:%s" % (message.pk, preview_stamp(message, context))
+
+
+def count(name, delta):
+    if not delta: return
+    try:
+        cache.incr(name, delta)
+    except ValueError: # not in the cache
+        cache.add(name, 0, TIMEOUT)
+        cache.incr(name, delta)
+
+
+def render_previews(messages, context):
+    """
+    Sets rendered_preview on each message: one cache fetch for all of them,
+    then a render (and one cache store) for those that missed.
+    """
+    messages = [message for message in messages if message is not None and message.pk is not None]
+    keys = [preview_key(message, context) for message in messages]
+    cached = previews.get_many(keys)
+    fresh = {}
+    for (message, key) in zip(messages, keys):
+        html = cached.get(key) or fresh.get(key)
+        if html is None:
+            page_context = dict((name, context.get(name)) for name in PAGE_CONTEXT)
+            page_context.update(user=context.get("user"), object=message)
+            html = fresh[key] = render_to_string(TEMPLATE, page_context)
+        message.rendered_preview = mark_safe(html)
+    if fresh:
+        previews.set_many(fresh, TIMEOUT)
+    count(HITS, len(messages) - len(fresh))
+    count(MISSES, len(fresh))
+
+
+def stats():
+    counts = cache.get_many([HITS, MISSES])
+    return {"hits": counts.get(HITS, 0), "misses": counts.get(MISSES, 0)}
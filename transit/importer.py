@@ -0,0 +1,67 @@
+"""
+Loads triples, as the feed lists them, alongside chat.importer's messages.
+"""
+from django.db import transaction
+
+from chat.importer import Authors, Numbering, Progress, chunked, parse_pk, parse_timestamp, reset_sequences
+from chat.models import ChatMessage, insert_as_given
+from .caching import bump_graph_version
+from .models import CurrentEdge, EdgeInterval, Triple, current_semantics
+
+
+def import_triples(records, batch_size=1000, create_authors=False, report=None):
+    """
+    Inserts triples, given as dicts with feed.TRIPLE_COLUMNS (pk optional),
+    batch_size at a time, with the author and timestamp as given, skipping
+    pks already taken. Each batch advances the derived tables for its own
+    rows, in timestamp order, ties by pk; rows older than what an earlier batch already
+    recorded for their (source, path) replay that pair's intervals instead.
+    A batch that rebinds a semantic name rebuilds the tables that follow them.
+    Calls report(progress) after every batch, and returns the Progress.
+    """
+    authors = Authors(create_authors)
+    numbering = Numbering()
+    progress = Progress()
+    for records in chunked(records, batch_size):
+        authors.resolve([record.get("author") for record in records])
+        triples = [
+            Triple(
+                pk=parse_pk(record.get("pk")),
+                source_id=parse_pk(record.get("source")),
+                path_id=parse_pk(record.get("path")),
+                destination_id=parse_pk(record.get("destination")),
+                author_id=authors[record.get("author")],
+                timestamp=parse_timestamp(record.get("timestamp")),
+            )
+            for record
+            in records
+        ]
+        referenced = set(
+            pk
+            for triple in triples
+            for pk in (triple.source_id, triple.path_id, triple.destination_id)
+            if pk is not None
+        )
+        missing = referenced - set(ChatMessage.objects.filter(pk__in=referenced).values_list("pk", flat=True))
+        if missing:
+            raise ValueError("no such messages: %s" % ", ".join(map(str, sorted(missing))))
+        numbering.check(triples)
+        pks = [triple.pk for triple in triples if triple.pk is not None]
+        taken = set(Triple.objects.filter(pk__in=pks).values_list("pk", flat=True)) if pks else set()
+        triples = [triple for triple in triples if triple.pk not in taken]
+        with transaction.commit_on_success():
+            semantics = current_semantics()
+            insert_as_given(Triple, triples)
+            reset_sequences(Triple)
+            stale = set()
+            # ties go by pk, as rebuild_indexes() replays them; rows without one keep their order
+            triples.sort(key=lambda triple: (triple.timestamp, triple.pk))
+            CurrentEdge.objects.notify(CurrentEdge.objects.advance_many(triples, stale), semantics)
+            for (source, path) in stale:
+                EdgeInterval.objects.replay(source, path)
+        # after the commit, so nobody caches the old graph under the new version
+        bump_graph_version()
+        progress.imported += len(triples)
+        progress.skipped += len(taken)
+        if report is not None: report(progress)
+    return progress
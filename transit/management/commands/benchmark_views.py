@@ -0,0 +1,55 @@
+import os
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand, CommandError
+
+from transit import benchmark
+
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(benchmark.__file__), "benchmark_baseline.json")
+
+
+class Command(NoArgsCommand):
+    help = (
+        "Times the chat and transit pages on generated data of several sizes, "
+        "and fails if any does worse than the stored baseline, or makes more "
+        "queries on more data."
+    )
+    option_list = NoArgsCommand.option_list + (
+        make_option("--sizes", dest="sizes", default="100,1000,5000", help="Message counts, comma-separated."),
+        make_option("--repeat", type="int", dest="repeat", default=5, help="Warm requests timed per page."),
+        make_option("--baseline", dest="baseline", default=DEFAULT_BASELINE),
+        make_option(
+            "--save-baseline",
+            action="store_true",
+            dest="save_baseline",
+            default=False,
+            help="Store these results as the new baseline instead of comparing.",
+        ),
+        make_option("--tolerance", type="float", dest="tolerance", default=benchmark.TOLERANCE),
+        make_option("--seed", type="int", dest="seed", default=0),
+    )
+
+    def handle_noargs(self, **options):
+        try:
+            sizes = [int(size) for size in options["sizes"].split(",")]
+        except ValueError:
+            raise CommandError("--sizes takes comma-separated message counts.")
+        results = benchmark.run(sizes, options["repeat"], self.report, seed=options["seed"])
+        growth = benchmark.query_growth(results)
+        if growth:
+            raise CommandError("More queries on more data:\n" + "\n".join(growth))
+        if options["save_baseline"]:
+            benchmark.save_baseline(options["baseline"], results)
+            self.stdout.write("Saved the baseline to %s." % options["baseline"])
+            return
+        if not os.path.exists(options["baseline"]):
+            self.stdout.write("No baseline at %s to compare with." % options["baseline"])
+            return
+        regressions = benchmark.compare(results, benchmark.load_baseline(options["baseline"]), options["tolerance"])
+        if regressions:
+            raise CommandError("Slower than the baseline:\n" + "\n".join(regressions))
+        self.stdout.write("No regressions against %s." % options["baseline"])
+
+    def report(self, key, result):
+        self.stdout.write("%-32s %8.1f ms %4d queries %+8d KB" % (key, result["ms"], result["queries"], result["peak_kb"]))
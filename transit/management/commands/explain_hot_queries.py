@@ -0,0 +1,114 @@
+import datetime
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import connection
+from django.utils import timezone
+from south.db import db
+
+from chat.models import ChatMessage
+from transit.models import Triple, CurrentEdge
+
+
+# the indexes added by chat 0002, transit 0002 and transit 0003
+INDEXES = (
+    (u"chat_chatmessage", ["timestamp"]),
+    (u"transit_triple", ["source_id", "path_id", "timestamp"]),
+    (u"transit_triple", ["source_id", "destination_id"]),
+    (u"transit_triple", ["destination_id", "source_id"]),
+    (u"transit_currentedge", ["destination_id", "source_id", "per_author"]),
+)
+
+EXPLAIN = {
+    "sqlite": "EXPLAIN QUERY PLAN ",
+    "postgresql": "EXPLAIN ",
+    "mysql": "EXPLAIN ",
+}
+
+
+def hot_queries():
+    sample = Triple.objects.exclude(source=None).exclude(path=None).exclude(destination=None)
+    sample = sample.order_by("-pk")[:1]
+    sample = sample[0] if sample else Triple(source_id=1, path_id=1, destination_id=1)
+    since = timezone.now() - datetime.timedelta(1)
+    return (
+        (
+            "Triple history of one (source, path), newest first",
+            Triple.objects.filter(source=sample.source_id, path=sample.path_id).order_by("-timestamp"),
+        ),
+        (
+            "Triple.get_tags: edges from a source back to it",
+            Triple.objects.filter(source=sample.source_id, destination=sample.source_id),
+        ),
+        (
+            "TaggedMessagesView: edges into a destination from a source",
+            Triple.objects.filter(destination=sample.destination_id, source=sample.source_id),
+        ),
+        (
+            "Triple.lookup: head of one (source, path)",
+            CurrentEdge.objects.filter(source=sample.source_id, path=sample.path_id, per_author=False),
+        ),
+        (
+            "ReplyView siblings: current edges into a destination from a source",
+            CurrentEdge.objects.pointing_at(sample.destination_id, sample.source_id),
+        ),
+        (
+            "MessageListView: first page of the log",
+            ChatMessage.objects.order_by("-timestamp")[:20],
+        ),
+        (
+            "TodayView: messages since yesterday",
+            ChatMessage.objects.filter(timestamp__gte=since).order_by("-timestamp"),
+        ),
+    )
+
+
+class Command(NoArgsCommand):
+    help = "Prints the query plans of the hot transit and chat queries."
+    option_list = NoArgsCommand.option_list + (
+        make_option(
+            "--compare",
+            action="store_true",
+            dest="compare",
+            default=False,
+            help="Also plan each query with the composite indexes dropped (they are recreated afterwards).",
+        ),
+    )
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        cursor = connection.cursor()
+        cursor.execute(EXPLAIN.get(connection.vendor, "EXPLAIN ") + sql, params)
+        return [" ".join(unicode(column) for column in row) for row in cursor.fetchall()]
+
+    def plans(self):
+        # a fresh connection, so no statement prepared against the old schema gets reused
+        connection.close()
+        return [(title, self.explain(queryset)) for (title, queryset) in hot_queries()]
+
+    def handle_noargs(self, **options):
+        after = self.plans()
+        before = None
+        if options["compare"]:
+            for (table, columns) in INDEXES:
+                db.delete_index(table, columns)
+            try:
+                before = self.plans()
+            finally:
+                for (table, columns) in INDEXES:
+                    db.create_index(table, columns)
+        self.stdout.write("Query plans on %s (%d messages, %d triples)" % (
+            connection.vendor,
+            ChatMessage.objects.count(),
+            Triple.objects.count(),
+        ))
+        for (index, (title, plan)) in enumerate(after):
+            self.stdout.write("")
+            self.stdout.write(title)
+            if before is not None:
+                self.stdout.write("  before:")
+                for line in before[index][1]:
+                    self.stdout.write("    " + line)
+                self.stdout.write("  after:")
+            for line in plan:
+                self.stdout.write("    " + line)
@@ -0,0 +1,33 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+
+from transit import synthetic
+
+
+class Command(NoArgsCommand):
+    help = "Adds made-up messages and triple history, for load testing and benchmarks."
+    option_list = NoArgsCommand.option_list + (
+        make_option("--messages", type="int", dest="messages", default=1000),
+        make_option("--users", type="int", dest="users", default=5),
+        make_option("--tags", type="int", dest="tags", default=8),
+        make_option("--churn", type="int", dest="churn", default=4, help="Most tag changes per message."),
+        make_option("--thread-depth", type="int", dest="thread_depth", default=20),
+        make_option("--days", type="int", dest="days", default=30, help="How far back the messages go."),
+        make_option("--seed", type="int", dest="seed", default=0),
+        make_option("--batch-size", type="int", dest="batch_size", default=1000),
+    )
+
+    def handle_noargs(self, **options):
+        dataset = synthetic.generate(
+            batch_size=options["batch_size"],
+            report=lambda progress: self.stdout.write("%s" % progress),
+            messages=options["messages"],
+            users=options["users"],
+            tags=options["tags"],
+            churn=options["churn"],
+            thread_depth=options["thread_depth"],
+            days=options["days"],
+            seed=options["seed"],
+        )
+        self.stdout.write("Generated messages %d to %d." % (dataset.base, dataset.message_pk(dataset.count - 1)))
@@ -0,0 +1,54 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from chat import importer
+from transit.importer import import_triples
+
+
+class Command(BaseCommand):
+    args = "<messages file>"
+    help = (
+        "Loads messages from a JSON Lines or CSV file in the export format "
+        "(gzipped if it ends in .gz), and optionally triples in the feed's columns."
+    )
+    option_list = BaseCommand.option_list + (
+        make_option("--format", dest="format", default=None, help="jsonl or csv; guessed from the file name by default."),
+        make_option("--triples", dest="triples", default=None, help="A file of triples to load after the messages."),
+        make_option("--batch-size", type="int", dest="batch_size", default=1000),
+        make_option(
+            "--create-authors",
+            action="store_true",
+            dest="create_authors",
+            default=False,
+            help="Create users for unknown author names instead of stopping.",
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1: raise CommandError("Give one messages file.")
+        report = lambda progress: self.stdout.write("%s" % progress)
+        try:
+            self.stdout.write("Messages:")
+            importer.import_messages(
+                self.records(args[0], options["format"]),
+                options["batch_size"],
+                options["create_authors"],
+                report,
+            )
+            if options["triples"]:
+                self.stdout.write("Triples:")
+                import_triples(
+                    self.records(options["triples"], options["format"]),
+                    options["batch_size"],
+                    options["create_authors"],
+                    report,
+                )
+        except (ValueError, KeyError, IOError) as e:
+            raise CommandError("Import stopped: %s" % e)
+        self.stdout.write("Done.")
+
+    def records(self, path, format=None):
+        format = format or importer.format_for(path)
+        if format not in importer.FORMATS: raise CommandError("Unknown format: %s" % format)
+        return importer.FORMATS[format](importer.open_lines(path))
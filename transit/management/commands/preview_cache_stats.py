@@ -0,0 +1,13 @@
+from django.core.management.base import NoArgsCommand
+
+from transit import fragments
+
+
+class Command(NoArgsCommand):
+    help = "Shows how often rendered message previews came from the cache."
+
+    def handle_noargs(self, **options):
+        stats = fragments.stats()
+        total = stats["hits"] + stats["misses"]
+        rate = 100.0 * stats["hits"] / total if total else 0
+        self.stdout.write("%d hits, %d misses (%.1f%% hit rate)." % (stats["hits"], stats["misses"], rate))
@@ -0,0 +1,11 @@
+from django.core.management.base import NoArgsCommand
+
+from transit.models import rebuild_indexes
+
+
+class Command(NoArgsCommand):
+    help = "Rebuilds the tables derived from the Triple history."
+
+    def handle_noargs(self, **options):
+        for (count, what) in rebuild_indexes():
+            self.stdout.write("Rebuilt %d %s." % (count, what))
@@ -0,0 +1,14 @@
+from django.core.management.base import NoArgsCommand
+
+from transit.models import Triple
+
+
+class Command(NoArgsCommand):
+    help = "Resolves every semantic name into the cache, e.g. right after a deploy."
+
+    def handle_noargs(self, **options):
+        resolved, fringe = Triple.warm_semantic_cache()
+        found = len([name for name in resolved if resolved[name] is not None])
+        self.stdout.write("Resolved %d of %d semantic names." % (found, len(resolved)))
+        if fringe:
+            self.stdout.write("Next to bootstrap: %s" % ", ".join(fringe))
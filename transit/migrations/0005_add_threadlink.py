@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from south.utils import datetime_utils as datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        # Adding model 'ThreadLink'
+        db.create_table(u'transit_threadlink', (
+            (u'id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('ancestor', self.gf('django.db.models.fields.related.ForeignKey')(related_name='thread_descendant_links', to=orm['chat.ChatMessage'])),
+            ('descendant', self.gf('django.db.models.fields.related.ForeignKey')(related_name='thread_ancestor_links', to=orm['chat.ChatMessage'])),
+            ('depth', self.gf('django.db.models.fields.PositiveIntegerField')()),
+        ))
+        db.send_create_signal(u'transit', ['ThreadLink'])
+
+        # Adding unique constraint on 'ThreadLink', fields ['ancestor', 'descendant']
+        db.create_unique(u'transit_threadlink', ['ancestor_id', 'descendant_id'])
+
+        # Adding index on 'ThreadLink', fields ['descendant', 'depth']
+        db.create_index(u'transit_threadlink', ['descendant_id', 'depth'])
+
+
+    def backwards(self, orm):
+        # Removing index on 'ThreadLink', fields ['descendant', 'depth']
+        db.delete_index(u'transit_threadlink', ['descendant_id', 'depth'])
+
+        # Removing unique constraint on 'ThreadLink', fields ['ancestor', 'descendant']
+        db.delete_unique(u'transit_threadlink', ['ancestor_id', 'descendant_id'])
+
+        # Deleting model 'ThreadLink'
+        db.delete_table(u'transit_threadlink')
+
+
+    models = {
+        u'auth.group': {
+            'Meta': {'object_name': 'Group'},
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '80'}),
+            'permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'})
+        },
+        u'auth.permission': {
+            'Meta': {'ordering': "(u'content_type__app_label', u'content_type__model', u'codename')", 'unique_together': "((u'content_type', u'codename'),)", 'object_name': 'Permission'},
+            'codename': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'content_type': ('django.db.models.fields.related.ForeignKey', [], {'to': u"orm['contenttypes.ContentType']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '50'})
+        },
+        u'auth.user': {
+            'Meta': {'object_name': 'User'},
+            'date_joined': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75', 'blank': 'True'}),
+            'first_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'groups': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Group']", 'symmetrical': 'False', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'is_active': ('django.db.models.fields.BooleanField', [], {'default': 'True'}),
+            'is_staff': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'is_superuser': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'last_login': ('django.db.models.fields.DateTimeField', [], {'default': 'datetime.datetime.now'}),
+            'last_name': ('django.db.models.fields.CharField', [], {'max_length': '30', 'blank': 'True'}),
+            'password': ('django.db.models.fields.CharField', [], {'max_length': '128'}),
+            'user_permissions': ('django.db.models.fields.related.ManyToManyField', [], {'to': u"orm['auth.Permission']", 'symmetrical': 'False', 'blank': 'True'}),
+            'username': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '30'})
+        },
+        u'chat.chatmessage': {
+            'Meta': {'object_name': 'ChatMessage'},
+            'author': ('cuser.fields.CurrentUserField', [], {'to': u"orm['auth.User']", 'null': 'True'}),
+            'body': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'body_preview': ('django.db.models.fields.CharField', [], {'db_index': 'True', 'max_length': '64', 'blank': 'True'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'timestamp': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'db_index': 'True', 'blank': 'True'})
+        },
+        u'contenttypes.contenttype': {
+            'Meta': {'ordering': "('name',)", 'unique_together': "(('app_label', 'model'),)", 'object_name': 'ContentType', 'db_table': "'django_content_type'"},
+            'app_label': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '100'})
+        },
+        u'transit.currentedge': {
+            'Meta': {'unique_together': "(('source', 'path', 'per_author', 'author'),)", 'object_name': 'CurrentEdge', 'index_together': "(('destination', 'source', 'per_author'),)"},
+            'author': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'+'", 'null': 'True', 'to': u"orm['auth.User']"}),
+            'destination': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'current_destination_set'", 'null': 'True', 'to': u"orm['chat.ChatMessage']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'path': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'current_path_set'", 'null': 'True', 'to': u"orm['chat.ChatMessage']"}),
+            'per_author': ('django.db.models.fields.BooleanField', [], {'default': 'False'}),
+            'source': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'current_source_set'", 'null': 'True', 'to': u"orm['chat.ChatMessage']"}),
+            'timestamp': ('django.db.models.fields.DateTimeField', [], {})
+        },
+        u'transit.threadlink': {
+            'Meta': {'unique_together': "(('ancestor', 'descendant'),)", 'object_name': 'ThreadLink', 'index_together': "(('descendant', 'depth'),)"},
+            'ancestor': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'thread_descendant_links'", 'to': u"orm['chat.ChatMessage']"}),
+            'depth': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'descendant': ('django.db.models.fields.related.ForeignKey', [], {'related_name': "'thread_ancestor_links'", 'to': u"orm['chat.ChatMessage']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'})
+        },
+        u'transit.triple': {
+            'Meta': {'object_name': 'Triple', 'index_together': "(('source', 'path', 'timestamp'), ('source', 'destination'), ('destination', 'source'))"},
+            'author': ('cuser.fields.CurrentUserField', [], {'to': u"orm['auth.User']", 'null': 'True'}),
+            'destination': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'destination_set'", 'null': 'True', 'to': u"orm['chat.ChatMessage']"}),
+            u'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'path': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'path_set'", 'null': 'True', 'to': u"orm['chat.ChatMessage']"}),
+            'source': ('django.db.models.fields.related.ForeignKey', [], {'blank': 'True', 'related_name': "'source_set'", 'null': 'True', 'to': u"orm['chat.ChatMessage']"}),
+            'timestamp': ('django.db.models.fields.DateTimeField', [], {'auto_now_add': 'True', 'blank': 'True'})
+        }
+    }
+
+    complete_apps = ['transit']
\ No newline at end of file
@@ -1,6 +1,23 @@
-from django.db import models
+from itertools import groupby
+
+from django.db import models, transaction
+from django.db.models import Q, F, Count, Max
+from django.db.models.signals import post_save, post_delete
+from django.conf import settings
 from cuser.fields import CurrentUserField
-from chat.models import ChatMessage
+from chat.importer import chunked
+from chat.models import ChatMessage, keeping_authors
+from chat.signals import message_committed, messages_imported
+from .caching import (
+    graph_version,
+    bump_graph_version,
+    get_cached_semantics,
+    cache_semantics,
+    get_cached_naturals,
+    cache_naturals,
+)
+from .signals import EdgeChange, current_edges_changed, current_edges_committed
+from . import live
 
 def cache_getter(getter):
     cache = {}
@@ -42,6 +59,168 @@ lookup_semantics = {
     "reply tag": ("featurebag", "five"),
 }
 
+
+def semantic_levels(semantics=lookup_semantics):
+    """
+    Orders the names so that each one comes after its source and path.
+    Returns a list of levels; a name's source and path are in earlier levels.
+    """
+    levels = []
+    placed = set([None])
+    remaining = set(semantics)
+    while remaining:
+        level = sorted(
+            name
+            for name
+            in remaining
+            if set(semantics[name]) <= placed
+        )
+        if not level:
+            raise ValueError("lookup_semantics has a cycle among %s" % sorted(remaining))
+        levels.append(level)
+        placed.update(level)
+        remaining.difference_update(level)
+    return levels
+
+def current_semantics():
+    """
+    Each name in lookup_semantics -> the pk of its message, or None.
+    """
+    version = graph_version()
+    resolved = get_cached_semantics(version)
+    if resolved is None:
+        (resolved, fringe) = Triple.warm_semantic_cache(version)
+    return dict((name, pk_or_none(resolved[name])) for name in lookup_semantics)
+
+
+def semantic_pairs(semantics):
+    """
+    The (source, path) pairs whose heads the names are resolved from, given
+    current_semantics(): a change to any of them may rebind a name.
+    """
+    pairs = set()
+    for (source_name, path_name) in lookup_semantics.values():
+        source = semantics.get(source_name)
+        path = semantics.get(path_name)
+        if source is None and source_name is not None: continue
+        if path is None and path_name is not None: continue
+        pairs.add((source, path))
+    return pairs
+
+
+def create_in_chunks(manager, objs, batch_size):
+    """
+    bulk_create()s objs, any iterable, batch_size at a time, so they're
+    never all in memory together. Returns how many there were.
+    """
+    count = 0
+    for chunk in chunked(objs, batch_size):
+        manager.bulk_create(chunk)
+        count += len(chunk)
+    return count
+
+
+def pk_or_none(message):
+    return getattr(message, "pk", message)
+
+
+def end_query(name, pk):
+    if pk is None: return Q(**{name + "__isnull": True})
+    return Q(**{name: pk})
+
+
+def pair_query(source, path):
+    """
+    Q object matching one (source_pk, path_pk) pair, where either end may be None.
+    """
+    return end_query("source", source) & end_query("path", path)
+
+
+def pairs_query(keys):
+    """
+    Q object matching any of the given (source_pk, path_pk) pairs.
+    """
+    paths_by_source = {}
+    for (source, path) in keys:
+        paths_by_source.setdefault(source, set()).add(path)
+    query = Q()
+    for (source, paths) in paths_by_source.items():
+        path_query = Q()
+        pks = [p for p in paths if p is not None]
+        if pks: path_query |= Q(path__in=pks)
+        if None in paths: path_query |= end_query("path", None)
+        query |= end_query("source", source) & path_query
+    return query
+
+
+# SQLite builds may take only 999 parameters a query; the rest of the query gets the difference
+PARAMETERS_PER_QUERY = 900
+
+
+def key_chunks(keys):
+    """
+    Splits keys, pks or (source_pk, path_pk) pairs, into sorted lists that
+    each fit PARAMETERS_PER_QUERY. A pk takes one parameter; a pair takes
+    one for its path and, as pairs_query() groups them, one for its source
+    the first time the list has it.
+    """
+    chunk = []
+    sources = set()
+    for key in sorted(keys):
+        new_source = isinstance(key, tuple) and key[0] not in sources
+        if len(chunk) + len(sources) + new_source >= PARAMETERS_PER_QUERY:
+            yield chunk
+            chunk = []
+            sources = set()
+            new_source = isinstance(key, tuple)
+        chunk.append(key)
+        if new_source: sources.add(key[0])
+    if chunk: yield chunk
+
+
+def in_chunks(keys, query):
+    """
+    Yields the rows of query(chunk) for each of key_chunks(keys) in turn,
+    rather than of one query with every key in it.
+    """
+    for chunk in key_chunks(keys):
+        for row in query(chunk):
+            yield row
+
+
+class TripleManager(models.Manager):
+    def current_values(self, pairs, author=NotImplemented, as_of=None):
+        """
+        Bulk version of Triple.lookup.
+        Takes an iterable of (source, path) pairs (messages, pks, or None)
+        and returns a dict mapping (source_pk, path_pk) to the latest destination,
+        or, given as_of, to the destination at that moment (authorless only).
+        """
+        if as_of is not None:
+            return EdgeInterval.objects.values_at(pairs, as_of)
+        return CurrentEdge.objects.current_values(pairs, author)
+
+    def record(self, triples):
+        """
+        Saves many new triples in one transaction, bumping the graph version once.
+        Triples without an author get the current user's, as save() would give them;
+        the rest keep theirs.
+        """
+        triples = list(triples)
+        if not triples: return triples
+        with transaction.commit_on_success():
+            with keeping_authors() as user:
+                for triple in triples:
+                    if triple.author_id is None and user is not None:
+                        triple.author_id = user.pk
+                self.bulk_create(triples)
+            semantics = current_semantics()
+            changes = CurrentEdge.objects.notify(CurrentEdge.objects.advance_many(triples), semantics)
+        bump_graph_version()
+        CurrentEdge.objects.announce(changes)
+        return triples
+
+
 class Triple(models.Model):
     source = models.ForeignKey(ChatMessage, related_name="source_set", null=True, blank=True)
     path = models.ForeignKey(ChatMessage, related_name="path_set", null=True, blank=True)
@@ -49,60 +228,127 @@ class Triple(models.Model):
     author = CurrentUserField(add_only=True)
     timestamp = models.DateTimeField(auto_now_add=True)
 
-    # TODO: manager method
+    objects = TripleManager()
+
+    class Meta:
+        index_together = (
+            ("source", "path", "timestamp"),
+            ("source", "destination"),
+            ("destination", "source"),
+        )
+
     @classmethod
     def lookup(cls, source, path, author=NotImplemented):
-        triples = cls.objects.filter(source=source, path=path).order_by("-timestamp")
-        if author is not NotImplemented:
-            triples = triples.filter(author=author)
-        if not triples: return None
-        return triples[0].destination
+        return CurrentEdge.objects.current_value(source, path, author)
 
     @classmethod
-    def lookup_semantic(cls, name):
+    def lookup_semantic(cls, name, version=None):
         if name not in lookup_semantics: return None
-        semantics = lookup_semantics[name]
-        if 3 == len(semantics): return semantics[2]
-        source_name, path_name = semantics
-        source = None
-        if source_name is not None:
-            source = cls.lookup_semantic(source_name)
-            if source is None: return None
-        path = None
-        if path_name is not None:
-            path = cls.lookup_semantic(path_name)
-            if path is None: return None
-        destination = cls.lookup(source, path)
-        if destination is None: return None
-        with_cache = (source_name, path_name, destination)
-        lookup_semantics[name] = with_cache
-        return destination
+        if version is None: version = graph_version()
+        cached = get_cached_semantics(version)
+        if cached is not None: return cached[name]
+        resolved, fringe = cls.warm_semantic_cache(version)
+        return resolved[name]
+
+    @classmethod
+    def resolve_semantics(cls):
+        """
+        Resolves every name in lookup_semantics with one bulk lookup per level.
+        Returns (resolved, fringe): resolved maps each name to its message or None,
+        and fringe lists the unresolved names whose source and path are both resolved.
+        """
+        resolved = {None: None}
+        fringe = []
+        for level in semantic_levels():
+            pairs = {}
+            for name in level:
+                source_name, path_name = lookup_semantics[name]
+                resolved[name] = None
+                if source_name is not None and resolved[source_name] is None: continue
+                if path_name is not None and resolved[path_name] is None: continue
+                pairs[name] = (pk_or_none(resolved[source_name]), pk_or_none(resolved[path_name]))
+            current = CurrentEdge.objects.current_values(pairs.values())
+            for (name, key) in sorted(pairs.items()):
+                resolved[name] = current[key]
+                if resolved[name] is None:
+                    fringe.append(name)
+        del resolved[None]
+        return resolved, fringe
+
+    @classmethod
+    def warm_semantic_cache(cls, version=None):
+        if version is None: version = graph_version()
+        resolved, fringe = cls.resolve_semantics()
+        cache_semantics(resolved, version)
+        return resolved, fringe
 
     @classmethod
-    def lookup_natural(cls, n, cache=[]):
+    def lookup_natural(cls, n):
         n = int(n) # try me
-        if n == 0: return cls.lookup_semantic("zero")
         if n < 0: return None
-        if n < len(cache): return cache[n]
+        chain = cls.natural_numbers()
+        if n >= len(chain): return None
+        return ChatMessage.objects.in_bulk([chain[n]]).get(chain[n])
+
+    @classmethod
+    def natural_numbers(cls):
+        """
+        The pks of zero, one, two, ... as far as the successor chain goes.
+        """
+        version = graph_version()
+        chain = get_cached_naturals(version)
+        if chain is not None: return chain
+        chain = cls.walk_naturals()
+        if cls.annotate_naturals(chain):
+            version = graph_version()
+        cache_naturals(chain, version)
+        return chain
+
+    @classmethod
+    def walk_naturals(cls):
+        zero = cls.lookup_semantic("zero")
+        if zero is None: return []
+        chain = [zero.pk]
         successor = cls.lookup_semantic("successor")
-        if successor is None: return None
-        previous = cls.lookup_natural(n - 1) # recursive
-        if previous is None: return None
-        if n == len(cache): cache.append(previous)
-        result = cls.lookup(successor, previous)
+        if successor is None: return chain
+        successors = dict(
+            CurrentEdge.objects.scoped().filter(source=successor).exclude(destination=None).values_list(
+                "path",
+                "destination",
+            )
+        )
+        seen = set(chain)
+        while chain[-1] in successors:
+            following = successors[chain[-1]]
+            if following in seen: break
+            seen.add(following)
+            chain.append(following)
+        return chain
+
+    @classmethod
+    def annotate_naturals(cls, chain):
+        """
+        Gives every natural number past zero a type=natural triple, all in one batch.
+        Returns how many triples were written.
+        """
         _type = cls.lookup_semantic("type")
         natural = cls.lookup_semantic("natural")
-        if _type is not None and natural is not None:
-            existing = cls.lookup(result, _type)
-            if existing is None:
-                cls(source=result, path=_type, destination=natural).save()
-        return result
+        if _type is None or natural is None: return 0
+        typed = CurrentEdge.objects.scoped().filter(source__in=chain, path=_type).exclude(destination=None)
+        typed = set(typed.values_list("source", flat=True))
+        missing = [
+            cls(source_id=pk, path=_type, destination=natural)
+            for pk
+            in chain[1:]
+            if pk not in typed
+        ]
+        cls.objects.record(missing)
+        return len(missing)
 
     @classmethod
     def set_semantic(cls, name, destination, commit=True):
         # definitely a bootstrapping helper and nothing more
-        semantics = lookup_semantics[name] # fail loudly: assume name in dict
-        sn, pn = semantics # fail loudly: assume not already cached
+        sn, pn = lookup_semantics[name] # fail loudly: assume name in dict
         source = cls.lookup_semantic(sn)
         if source is None and sn is not None: return None
         path = cls.lookup_semantic(pn)
@@ -115,10 +361,748 @@ class Triple(models.Model):
     def get_tags(cls):
         tag = cls.lookup_semantic("tag")
         if tag is None: return None
-        trips = cls.objects.filter(source=tag, destination=tag)
-        result = [t.path for t in trips if cls.lookup(tag, t.path) == tag]
-        return result
+        heads = CurrentEdge.objects.pointing_at(tag, tag).exclude(path=None)
+        return [head.path for head in heads.select_related("path").order_by("path")]
 
 
     def current_value(self, author=NotImplemented):
-        return self.lookup(self.source, self.path, author)
+        return self.lookup(self.source_id, self.path_id, author)
+
+    def save(self, *args, **kwargs):
+        with transaction.commit_on_success():
+            semantics = current_semantics()
+            super(Triple, self).save(*args, **kwargs)
+            changes = CurrentEdge.objects.notify([CurrentEdge.objects.advance(self)], semantics)
+        # after the commit, so nobody caches the old graph under the new version
+        bump_graph_version()
+        CurrentEdge.objects.announce(changes)
+
+    def delete(self, *args, **kwargs):
+        key = (self.source_id, self.path_id)
+        with transaction.commit_on_success():
+            semantics = current_semantics()
+            super(Triple, self).delete(*args, **kwargs)
+            changes = CurrentEdge.objects.notify([CurrentEdge.objects.recompute(*key)], semantics)
+            EdgeInterval.objects.replay(*key)
+        bump_graph_version()
+        CurrentEdge.objects.announce(changes)
+
+
+class CurrentEdgeManager(models.Manager):
+    def scoped(self, author=NotImplemented):
+        if author is NotImplemented:
+            return self.filter(per_author=False)
+        return self.filter(per_author=True, author=pk_or_none(author))
+
+    def pointing_at(self, destination, source=NotImplemented):
+        """
+        The current edges into destination, optionally only those from source.
+        """
+        heads = self.scoped().filter(destination=destination)
+        if source is not NotImplemented:
+            heads = heads.filter(end_query("source", pk_or_none(source)))
+        return heads
+
+    def held_by(self, source):
+        """
+        The current edges from source that point somewhere, e.g. sticky's pins.
+        """
+        return self.scoped().filter(source=pk_or_none(source)).exclude(path=None).exclude(destination=None)
+
+    def current_value(self, source, path, author=NotImplemented):
+        heads = self.scoped(author).filter(pair_query(pk_or_none(source), pk_or_none(path)))
+        heads = list(heads.select_related("destination")[:1])
+        if not heads: return None
+        return heads[0].destination
+
+    def current_values(self, pairs, author=NotImplemented):
+        keys = set((pk_or_none(s), pk_or_none(p)) for (s, p) in pairs)
+        result = dict((key, None) for key in keys)
+        if not keys: return result
+        heads = in_chunks(keys, lambda chunk: self.scoped(author).filter(pairs_query(chunk)).select_related("destination"))
+        for head in heads:
+            key = (head.source_id, head.path_id)
+            if key in result:
+                result[key] = head.destination
+        return result
+
+    def notify(self, changes, semantics=None):
+        """
+        Sends current_edges_changed for changes, Nones dropped. Given semantics,
+        current_semantics() from before the heads moved, also rebuilds the
+        tables that follow the semantics if the changes rebound any name:
+        the handlers only move single edges, under the names as they were.
+        """
+        changes = [change for change in changes if change is not None]
+        if changes:
+            current_edges_changed.send(sender=self.model, changes=changes)
+            if semantics is not None and self.rebinds(changes, semantics):
+                for (manager, what) in semantic_indexes():
+                    manager.rebuild()
+        return changes
+
+    def rebinds(self, changes, semantics):
+        pairs = semantic_pairs(semantics)
+        if not any((change.source, change.path) in pairs for change in changes): return False
+        # resolved afresh, from the heads as they now stand
+        bump_graph_version()
+        return current_semantics() != semantics
+
+    def announce(self, changes):
+        """
+        For after the transaction that notify()'d changes has committed.
+        """
+        if changes:
+            current_edges_committed.send(sender=self.model, changes=changes)
+
+    def advance(self, triple):
+        """
+        Moves the heads for triple's (source, path) to triple, unless they already point at something newer.
+        Returns an EdgeChange if the (authorless) head moved.
+        """
+        change = None
+        for per_author in (False, True):
+            heads = self.filter(
+                pair_query(triple.source_id, triple.path_id),
+                per_author=per_author,
+            )
+            if per_author:
+                heads = heads.filter(author=triple.author_id)
+            head = list(heads[:1])
+            if head:
+                head = head[0]
+                if head.timestamp > triple.timestamp: continue
+            else:
+                head = self.model(
+                    source_id=triple.source_id,
+                    path_id=triple.path_id,
+                    per_author=per_author,
+                )
+            moved = head.pk is None or (
+                (head.destination_id, head.author_id) != (triple.destination_id, triple.author_id)
+            )
+            if moved and not per_author:
+                change = EdgeChange(
+                    triple.source_id,
+                    triple.path_id,
+                    head.destination_id,
+                    triple.destination_id,
+                    head.author_id,
+                    triple.author_id,
+                    triple.timestamp,
+                )
+            head.destination_id = triple.destination_id
+            head.author_id = triple.author_id
+            head.timestamp = triple.timestamp
+            head.save()
+        return change
+
+    def advance_many(self, triples, stale=None):
+        """
+        advance() for a whole batch, in order: loads the heads it touches in one query
+        and writes each head once. Returns the EdgeChanges, one per step that moved an authorless head.
+        Given a set as stale, adds to it the (source, path) of every triple older than its authorless head.
+        """
+        heads = {}
+        keys = set((triple.source_id, triple.path_id) for triple in triples)
+        for head in in_chunks(keys, lambda chunk: self.filter(pairs_query(chunk))):
+            heads[(head.source_id, head.path_id, head.per_author, head.author_id if head.per_author else None)] = head
+        changes = []
+        dirty = {}
+        for triple in triples:
+            for per_author in (False, True):
+                key = (triple.source_id, triple.path_id, per_author, triple.author_id if per_author else None)
+                head = heads.get(key)
+                if head is None:
+                    head = heads[key] = self.model(
+                        source_id=triple.source_id,
+                        path_id=triple.path_id,
+                        per_author=per_author,
+                    )
+                elif head.timestamp > triple.timestamp:
+                    if stale is not None and not per_author:
+                        stale.add((triple.source_id, triple.path_id))
+                    continue
+                moved = head.timestamp is None or (
+                    (head.destination_id, head.author_id) != (triple.destination_id, triple.author_id)
+                )
+                if moved and not per_author:
+                    changes.append(EdgeChange(
+                        triple.source_id,
+                        triple.path_id,
+                        head.destination_id,
+                        triple.destination_id,
+                        head.author_id,
+                        triple.author_id,
+                        triple.timestamp,
+                    ))
+                head.destination_id = triple.destination_id
+                head.author_id = triple.author_id
+                head.timestamp = triple.timestamp
+                dirty[key] = head
+        self.bulk_create([edge for edge in dirty.values() if edge.pk is None])
+        for head in dirty.values():
+            if head.pk is not None:
+                head.save()
+        return changes
+
+    def recompute(self, source, path):
+        """
+        Replays the history of one (source, path), e.g. after one of its triples is deleted.
+        Returns an EdgeChange if the (authorless) head moved.
+        """
+        heads = self.filter(pair_query(source, path))
+        old = list(heads.filter(per_author=False).values_list("destination", "author", "timestamp"))
+        old = old[0] if old else (None, None, None)
+        heads.delete()
+        history = Triple.objects.filter(pair_query(source, path)).order_by("timestamp", "pk")
+        for triple in history:
+            self.advance(triple)
+        new = list(heads.filter(per_author=False).values_list("destination", "author", "timestamp"))
+        new = new[0] if new else (None, None, None)
+        if new[:2] == old[:2]: return None
+        return EdgeChange(source, path, old[0], new[0], old[1], new[1], new[2] or old[2])
+
+    def rebuild(self, batch_size=500):
+        """
+        Throws away every head and replays the whole Triple history, a
+        (source, path) at a time.
+        """
+        with transaction.commit_on_success():
+            self.all().delete()
+            count = create_in_chunks(self, self.replayed_heads(), batch_size)
+        bump_graph_version()
+        return count
+
+    def replayed_heads(self):
+        history = Triple.objects.order_by("source", "path", "timestamp", "pk").values_list(
+            "source", "path", "destination", "author", "timestamp",
+        )
+        for ((source, path), triples) in groupby(history.iterator(), lambda row: row[:2]):
+            heads = {}
+            for (_, _, destination, author, timestamp) in triples:
+                heads[(False, None)] = (destination, author, timestamp)
+                heads[(True, author)] = (destination, author, timestamp)
+            for ((per_author, _), (destination, author, timestamp)) in heads.items():
+                yield self.model(
+                    source_id=source,
+                    path_id=path,
+                    per_author=per_author,
+                    destination_id=destination,
+                    author_id=author,
+                    timestamp=timestamp,
+                )
+
+
+class CurrentEdge(models.Model):
+    """
+    The head of the Triple history for one (source, path) pair:
+    whatever the latest triple says it points at.
+    Rows with per_author set are the head of only that author's triples.
+    """
+    source = models.ForeignKey(ChatMessage, related_name="current_source_set", null=True, blank=True)
+    path = models.ForeignKey(ChatMessage, related_name="current_path_set", null=True, blank=True)
+    destination = models.ForeignKey(ChatMessage, related_name="current_destination_set", null=True, blank=True)
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="+", null=True, blank=True)
+    per_author = models.BooleanField(default=False)
+    timestamp = models.DateTimeField()
+
+    objects = CurrentEdgeManager()
+
+    class Meta:
+        unique_together = (("source", "path", "per_author", "author"),)
+        index_together = (("destination", "source", "per_author"),)
+
+
+class ThreadLinkManager(models.Manager):
+    def attach(self, child, parent):
+        """
+        Hangs child, with everything under it, from parent (or makes it a root, for None).
+        """
+        subtree = dict(self.filter(ancestor=child).values_list("descendant", "depth"))
+        if not subtree:
+            self.create(ancestor_id=child, descendant_id=child, depth=0)
+            subtree = {child: 0}
+        self.filter(descendant__in=list(subtree)).exclude(ancestor__in=list(subtree)).delete()
+        if parent is None: return
+        if parent in subtree: return # a reply loop; leave child as a root
+        ancestors = dict(self.filter(descendant=parent).values_list("ancestor", "depth"))
+        if not ancestors:
+            self.create(ancestor_id=parent, descendant_id=parent, depth=0)
+            ancestors = {parent: 0}
+        self.bulk_create([
+            self.model(ancestor_id=ancestor, descendant_id=descendant, depth=up + down + 1)
+            for (ancestor, up) in ancestors.items()
+            for (descendant, down) in subtree.items()
+        ])
+
+    def ancestor_chains(self, messages):
+        """
+        Maps each message's pk to its ancestors, root first.
+        """
+        pks = [pk_or_none(message) for message in messages]
+        result = dict((pk, []) for pk in pks)
+        links = in_chunks(pks, lambda chunk: (
+            self.filter(descendant__in=chunk, depth__gt=0).select_related("ancestor__author").order_by("descendant", "-depth")
+        ))
+        for link in links:
+            result[link.descendant_id].append(link.ancestor)
+        return result
+
+    def descendant_counts(self, messages):
+        pks = [pk_or_none(message) for message in messages]
+        result = dict((pk, 0) for pk in pks)
+        counts = in_chunks(pks, lambda chunk: (
+            self.filter(ancestor__in=chunk, depth__gt=0).values("ancestor").annotate(count=Count("pk"))
+        ))
+        for row in counts:
+            result[row["ancestor"]] = row["count"]
+        return result
+
+    def parents(self, messages):
+        pks = [pk_or_none(message) for message in messages]
+        return dict(in_chunks(pks, lambda chunk: self.filter(descendant__in=chunk, depth=1).values_list("descendant", "ancestor")))
+
+    def thread(self, root, max_depth=None):
+        """
+        [(pk, depth)] for root and everything under it, in reading order:
+        each message, then its replies, oldest first, each followed by theirs.
+        """
+        links = self.filter(ancestor=root)
+        if max_depth is not None:
+            links = links.filter(depth__lte=max_depth)
+        members = dict(
+            (pk, (depth, timestamp))
+            for (pk, depth, timestamp)
+            in links.values_list("descendant", "depth", "descendant__timestamp").iterator()
+        )
+        root = pk_or_none(root)
+        if root not in members: return []
+        replies = {}
+        edges = self.filter(depth=1, descendant__in=links.values("descendant")).values_list("ancestor", "descendant")
+        for (parent, child) in edges.iterator():
+            if parent in members:
+                replies.setdefault(parent, []).append(child)
+        order = []
+        stack = [root]
+        while stack:
+            pk = stack.pop()
+            order.append((pk, members[pk][0]))
+            stack.extend(sorted(replies.get(pk, ()), key=lambda child: (members[child][1], child), reverse=True))
+        return order
+
+    def rebuild(self, batch_size=500):
+        self.all().delete()
+        reply = Triple.lookup_semantic("reply")
+        if reply is None: return 0
+        replies = CurrentEdge.objects.scoped().filter(source=reply).exclude(path=None)
+        # one pk per reply, to walk up from; the links themselves are written as they're found
+        parents = self.acyclic_parents(replies.order_by("timestamp", "path").values_list("path", "destination").iterator())
+        return create_in_chunks(self, self.links_for(parents), batch_size)
+
+    def acyclic_parents(self, replies):
+        """
+        child -> parent for (child, parent) pairs in the order attach() would
+        have seen them, refusing each reply that closes a loop as it does: the
+        child is left a root instead.
+        """
+        parents = {}
+        for (child, parent) in replies:
+            ancestor = parent
+            while ancestor is not None and ancestor != child:
+                ancestor = parents.get(ancestor)
+            parents[child] = parent if ancestor is None else None
+        return parents
+
+    def links_for(self, parents):
+        for child in (set(parents) | set(parents.values())) - set([None]):
+            yield self.model(ancestor_id=child, descendant_id=child, depth=0)
+            ancestor = parents.get(child)
+            depth = 1
+            while ancestor is not None:
+                yield self.model(ancestor_id=ancestor, descendant_id=child, depth=depth)
+                ancestor = parents.get(ancestor)
+                depth += 1
+
+
+class ThreadLink(models.Model):
+    """
+    Closure table of the reply trees: one row for every message and each of its
+    ancestors (and itself, at depth 0), following the current reply triples.
+    """
+    ancestor = models.ForeignKey(ChatMessage, related_name="thread_descendant_links")
+    descendant = models.ForeignKey(ChatMessage, related_name="thread_ancestor_links")
+    depth = models.PositiveIntegerField()
+
+    objects = ThreadLinkManager()
+
+    class Meta:
+        unique_together = (("ancestor", "descendant"),)
+        index_together = (("descendant", "depth"),)
+
+
+def update_threads(sender, changes, **kwargs):
+    reply = Triple.lookup_semantic("reply")
+    if reply is None: return
+    for change in changes:
+        if change.source != reply.pk or change.path is None: continue
+        if change.old_destination == change.destination: continue
+        ThreadLink.objects.attach(change.path, change.destination)
+
+current_edges_changed.connect(update_threads, dispatch_uid="transit.models.update_threads")
+
+
+class TaggingQueueManager(models.Manager):
+    def enqueue(self, messages):
+        messages = dict((message.pk, message) for message in messages)
+        queued = self.filter(message__in=list(messages)).values_list("message", flat=True)
+        for pk in queued:
+            del messages[pk]
+        self.bulk_create([
+            self.model(message_id=pk, timestamp=message.timestamp)
+            for (pk, message) in messages.items()
+        ])
+
+    def dequeue(self, pks):
+        self.filter(message__in=list(pks)).delete()
+
+    def rebuild(self, batch_size=500):
+        self.all().delete()
+        messages = ChatMessage.objects.all()
+        tag = Triple.lookup_semantic("tag")
+        if tag is not None:
+            tagged = CurrentEdge.objects.scoped().filter(source=tag).exclude(destination=None)
+            messages = messages.exclude(pk__in=tagged.values("path"))
+        return create_in_chunks(self, (
+            self.model(message_id=pk, timestamp=timestamp)
+            for (pk, timestamp)
+            in messages.values_list("pk", "timestamp").iterator()
+        ), batch_size)
+
+
+class TaggingQueueEntry(models.Model):
+    """
+    The messages whose current tag is unset, in the order the untagged page
+    works through them. The timestamp is the message's, copied for paging.
+    """
+    message = models.OneToOneField(ChatMessage, primary_key=True, related_name="tagging_queue_entry")
+    timestamp = models.DateTimeField()
+
+    objects = TaggingQueueManager()
+
+    class Meta:
+        index_together = (("timestamp", "message"),)
+
+
+def queue_new_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        TaggingQueueEntry.objects.enqueue([instance])
+
+post_save.connect(queue_new_message, sender=ChatMessage, dispatch_uid="transit.models.queue_new_message")
+
+
+def queue_imported_messages(sender, messages, **kwargs):
+    TaggingQueueEntry.objects.enqueue(messages)
+
+messages_imported.connect(queue_imported_messages, sender=ChatMessage, dispatch_uid="transit.models.queue_imported_messages")
+
+
+def update_tagging_queue(sender, changes, **kwargs):
+    tag = Triple.lookup_semantic("tag")
+    if tag is None: return
+    # the last change to each message is the one that counts
+    latest = dict((change.path, change.destination) for change in changes if change.source == tag.pk and change.path is not None)
+    untagged = [path for (path, destination) in latest.items() if destination is None]
+    tagged = [path for (path, destination) in latest.items() if destination is not None]
+    if untagged:
+        TaggingQueueEntry.objects.enqueue(ChatMessage.objects.filter(pk__in=untagged).only("timestamp"))
+    if tagged:
+        TaggingQueueEntry.objects.dequeue(tagged)
+
+current_edges_changed.connect(update_tagging_queue, dispatch_uid="transit.models.update_tagging_queue")
+
+
+class TagMembershipManager(models.Manager):
+    def move(self, assignments, authors={}):
+        """
+        Applies {message pk: tag pk or None} to the index and the tag counts.
+        """
+        current = dict(self.filter(message__in=list(assignments)).values_list("message", "tag"))
+        deltas = {}
+        cleared = [pk for (pk, tag) in assignments.items() if tag is None and pk in current]
+        if cleared:
+            self.filter(message__in=cleared).delete() # uncounted by uncount_deleted_membership
+        for (pk, tag) in assignments.items():
+            if tag is None or pk not in current: continue
+            self.filter(message=pk).update(tag=tag, author=authors.get(pk))
+            if tag != current[pk]:
+                deltas[current[pk]] = deltas.get(current[pk], 0) - 1
+                deltas[tag] = deltas.get(tag, 0) + 1
+        added = [pk for (pk, tag) in assignments.items() if tag is not None and pk not in current]
+        if added:
+            timestamps = ChatMessage.objects.filter(pk__in=added).values_list("pk", "timestamp")
+            self.bulk_create([
+                self.model(message_id=pk, tag_id=assignments[pk], author_id=authors.get(pk), timestamp=timestamp)
+                for (pk, timestamp) in timestamps
+            ])
+            for (pk, timestamp) in timestamps:
+                deltas[assignments[pk]] = deltas.get(assignments[pk], 0) + 1
+        TagCount.objects.adjust(deltas)
+
+    def counts_for(self, author):
+        """
+        Maps tag pks to how many messages author has currently given them.
+        """
+        counts = self.filter(author=pk_or_none(author)).values("tag").annotate(count=Count("message"))
+        return dict((row["tag"], row["count"]) for row in counts)
+
+    def rebuild(self, batch_size=500):
+        TagCount.objects.all().delete()
+        self.all().delete()
+        tag = Triple.lookup_semantic("tag")
+        if tag is None: return 0
+        heads = CurrentEdge.objects.scoped().filter(source=tag).exclude(path=None).exclude(destination=None)
+        count = create_in_chunks(self, (
+            self.model(message_id=pk, tag_id=tag_pk, author_id=author, timestamp=timestamp)
+            for (pk, tag_pk, author, timestamp)
+            in heads.values_list("path", "destination", "author", "path__timestamp").iterator()
+        ), batch_size)
+        counts = self.values("tag").annotate(count=Count("message"))
+        TagCount.objects.bulk_create([TagCount(tag_id=row["tag"], count=row["count"]) for row in counts])
+        return count
+
+
+class TagMembership(models.Model):
+    """
+    The current tag of every tagged message, and who gave it.
+    The timestamp is the message's, copied for paging each tag's messages.
+    """
+    message = models.OneToOneField(ChatMessage, primary_key=True, related_name="tag_membership")
+    tag = models.ForeignKey(ChatMessage, related_name="tag_members")
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="+", null=True, blank=True)
+    timestamp = models.DateTimeField()
+
+    objects = TagMembershipManager()
+
+    class Meta:
+        index_together = (("tag", "timestamp", "message"), ("author", "tag"))
+
+
+class TagCountManager(models.Manager):
+    def adjust(self, deltas):
+        for (tag, delta) in deltas.items():
+            if not delta: continue
+            if not self.filter(tag=tag).update(count=F("count") + delta) and delta > 0:
+                self.create(tag_id=tag, count=delta)
+
+
+class TagCount(models.Model):
+    """
+    How many messages each tag currently has; kept alongside TagMembership.
+    """
+    tag = models.OneToOneField(ChatMessage, primary_key=True, related_name="tag_count")
+    count = models.PositiveIntegerField(default=0)
+
+    objects = TagCountManager()
+
+
+def update_tag_memberships(sender, changes, **kwargs):
+    tag = Triple.lookup_semantic("tag")
+    if tag is None: return
+    changes = [change for change in changes if change.source == tag.pk and change.path is not None]
+    if not changes: return
+    TagMembership.objects.move(
+        dict((change.path, change.destination) for change in changes),
+        dict((change.path, change.author) for change in changes),
+    )
+
+current_edges_changed.connect(update_tag_memberships, dispatch_uid="transit.models.update_tag_memberships")
+
+
+def uncount_deleted_membership(sender, instance, **kwargs):
+    # also covers memberships deleted along with their message
+    TagCount.objects.adjust({instance.tag_id: -1})
+
+post_delete.connect(uncount_deleted_membership, sender=TagMembership, dispatch_uid="transit.models.uncount_deleted_membership")
+
+
+LIVE_SEMANTICS = ("hide", "sticky", "tag", "reply")
+
+def publish_edge_changes(sender, changes, **kwargs):
+    if not live.enabled(): return
+    semantics = dict(
+        (semantic.pk, name)
+        for (name, semantic)
+        in ((name, Triple.lookup_semantic(name)) for name in LIVE_SEMANTICS)
+        if semantic is not None
+    )
+    for change in changes:
+        if change.source in semantics:
+            live.publish(semantics[change.source], path=change.path, destination=change.destination)
+
+current_edges_committed.connect(publish_edge_changes, dispatch_uid="transit.models.publish_edge_changes")
+
+
+def publish_new_message(sender, instance, created, **kwargs):
+    if created and live.enabled():
+        live.publish("message", pk=instance.pk)
+
+message_committed.connect(publish_new_message, sender=ChatMessage, dispatch_uid="transit.models.publish_new_message")
+
+
+def edge_spans(history):
+    """
+    Folds one (source, path)'s (destination, author, timestamp) history,
+    oldest first, into (destination, author, valid_from, valid_to) spans,
+    leaving out the spans where it pointed at nothing.
+    """
+    spans = []
+    current = None
+    for (destination, author, timestamp) in history:
+        if current is not None:
+            if (destination, author) == current[:2]: continue
+            spans.append(current + (timestamp,))
+        current = (destination, author, timestamp)
+    if current is not None:
+        spans.append(current + (None,))
+    return [span for span in spans if span[0] is not None]
+
+
+class EdgeIntervalManager(models.Manager):
+    def at(self, moment):
+        """
+        The intervals in force at moment; as of then, what CurrentEdge.objects.scoped() is now.
+        """
+        return self.filter(Q(valid_to__gt=moment) | Q(valid_to=None), valid_from__lte=moment)
+
+    def values_at(self, pairs, moment):
+        """
+        current_values as of moment.
+        """
+        keys = set((pk_or_none(s), pk_or_none(p)) for (s, p) in pairs)
+        result = dict((key, None) for key in keys)
+        if not keys: return result
+        intervals = in_chunks(keys, lambda chunk: self.at(moment).filter(pairs_query(chunk)).select_related("destination"))
+        for interval in intervals:
+            key = (interval.source_id, interval.path_id)
+            if key in result:
+                result[key] = interval.destination
+        return result
+
+    def spans_for(self, source, path, history):
+        return [
+            self.model(
+                source_id=source,
+                path_id=path,
+                destination_id=destination,
+                author_id=author,
+                valid_from=valid_from,
+                valid_to=valid_to,
+            )
+            for (destination, author, valid_from, valid_to)
+            in edge_spans(history)
+        ]
+
+    def replay(self, source, path):
+        """
+        Rebuilds the intervals of one (source, path), e.g. after one of its triples is deleted.
+        """
+        self.filter(pair_query(source, path)).delete()
+        history = Triple.objects.filter(pair_query(source, path)).order_by("timestamp", "pk")
+        self.bulk_create(self.spans_for(source, path, history.values_list("destination", "author", "timestamp")))
+
+    def rebuild(self, batch_size=500):
+        self.all().delete()
+        history = Triple.objects.order_by("source", "path", "timestamp", "pk").values_list(
+            "source", "path", "destination", "author", "timestamp",
+        )
+        return create_in_chunks(self, (
+            span
+            for ((source, path), triples) in groupby(history.iterator(), lambda row: row[:2])
+            for span in self.spans_for(source, path, (row[2:] for row in triples))
+        ), batch_size)
+
+
+class EdgeInterval(models.Model):
+    """
+    When each (source, path) pointed where: one row per stretch of time its
+    authorless head stayed the same, from valid_from until valid_to (None
+    for the stretch still going on).
+    """
+    source = models.ForeignKey(ChatMessage, related_name="interval_source_set", null=True, blank=True)
+    path = models.ForeignKey(ChatMessage, related_name="interval_path_set", null=True, blank=True)
+    destination = models.ForeignKey(ChatMessage, related_name="interval_destination_set")
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, related_name="+", null=True, blank=True)
+    valid_from = models.DateTimeField()
+    valid_to = models.DateTimeField(null=True, blank=True)
+
+    objects = EdgeIntervalManager()
+
+    class Meta:
+        index_together = (
+            ("source", "path", "valid_from"),
+            ("path", "valid_from"),
+            ("destination", "valid_from"),
+        )
+
+
+def update_edge_intervals(sender, changes, **kwargs):
+    keys = set((change.source, change.path) for change in changes)
+    intervals = lambda chunk: EdgeInterval.objects.filter(pairs_query(chunk))
+    # where each pair's intervals end so far; anything older rewrites the past, which Triple.delete replays instead
+    ends = {}
+    last = lambda chunk: intervals(chunk).values("source", "path").annotate(last_from=Max("valid_from"), last_to=Max("valid_to"))
+    for row in in_chunks(keys, last):
+        ends[(row["source"], row["path"])] = max(row["last_from"], row["last_to"] or row["last_from"])
+    running = dict(
+        ((interval.source_id, interval.path_id), interval)
+        for interval in in_chunks(keys, lambda chunk: intervals(chunk).filter(valid_to=None))
+    )
+    closed = {}
+    created = []
+    for change in changes:
+        key = (change.source, change.path)
+        if key in ends and change.timestamp < ends[key]: continue
+        interval = running.pop(key, None)
+        if interval is not None:
+            interval.valid_to = ends[key] = change.timestamp
+            if interval.pk is not None:
+                closed[interval.pk] = change.timestamp
+        if change.destination is not None:
+            running[key] = EdgeInterval(
+                source_id=change.source,
+                path_id=change.path,
+                destination_id=change.destination,
+                author_id=change.author,
+                valid_from=change.timestamp,
+            )
+            created.append(running[key])
+            ends[key] = change.timestamp
+    for (pk, valid_to) in closed.items():
+        EdgeInterval.objects.filter(pk=pk).update(valid_to=valid_to)
+    EdgeInterval.objects.bulk_create(created)
+
+current_edges_changed.connect(update_edge_intervals, dispatch_uid="transit.models.update_edge_intervals")
+
+
+def semantic_indexes():
+    """
+    The tables that follow the semantics (tag, reply) as well as the heads.
+    """
+    return [
+        (ThreadLink.objects, "thread links"),
+        (TaggingQueueEntry.objects, "queued untagged messages"),
+        (TagMembership.objects, "tagged messages"),
+    ]
+
+
+def rebuild_indexes():
+    """
+    Rebuilds every table derived from the Triple history, heads first, each
+    in its own transaction. Yields (count, what) as each one is done.
+    """
+    yield CurrentEdge.objects.rebuild(), "current edges"
+    for (manager, what) in semantic_indexes() + [(EdgeInterval.objects, "edge intervals")]:
+        with transaction.commit_on_success():
+            count = manager.rebuild()
+        yield count, what
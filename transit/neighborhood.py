@@ -0,0 +1,47 @@
+from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+
+from .models import CurrentEdge, EdgeInterval
+
+
+ROLES = ("source", "path", "destination")
+
+
+class Neighborhood(object):
+    """
+    The current edges around one message (or, with as_of, the edges as they
+    were then), one section per role it plays in them.
+    Each section is paginated and costs a constant number of queries.
+    """
+    page_size = 50
+
+    def __init__(self, message, page_size=None, as_of=None):
+        self.message = message
+        self.as_of = as_of
+        if page_size is not None:
+            self.page_size = page_size
+
+    def edges(self, role):
+        if self.as_of is not None:
+            edges = EdgeInterval.objects.at(self.as_of).filter(**{role: self.message})
+            edges = edges.select_related(*["%s__author" % other for other in ROLES if other != role])
+            return edges.order_by("-valid_from", "-pk")
+        if role == "destination":
+            edges = CurrentEdge.objects.pointing_at(self.message)
+        else:
+            edges = CurrentEdge.objects.scoped().filter(**{role: self.message})
+        edges = edges.select_related(*[
+            "%s__author" % other
+            for other
+            in ROLES
+            if other != role
+        ])
+        return edges.order_by("-timestamp", "-pk")
+
+    def page(self, role, number=1):
+        paginator = Paginator(self.edges(role), self.page_size)
+        try:
+            return paginator.page(number)
+        except PageNotAnInteger:
+            return paginator.page(1)
+        except EmptyPage:
+            return paginator.page(paginator.num_pages)
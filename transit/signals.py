@@ -0,0 +1,18 @@
+from collections import namedtuple
+
+from django.dispatch import Signal
+
+
+# pks of what a (source, path) head pointed at before and after a write
+EdgeChange = namedtuple(
+    "EdgeChange",
+    "source path old_destination destination old_author author timestamp",
+)
+
+# Sent inside the writing transaction, once per Triple save, delete or batch,
+# with changes: a list of EdgeChange in the order they happened.
+current_edges_changed = Signal(providing_args=["changes"])
+
+# Sent after that transaction commits, with the same changes; for telling
+# the world outside the database.
+current_edges_committed = Signal(providing_args=["changes"])
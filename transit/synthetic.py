@@ -0,0 +1,147 @@
+"""
+Made-up history shaped like the real thing, for seeing how the views scale:
+a bootstrapped lookup_semantics graph, tags that get changed a few times
+over, hidden and pinned messages that sometimes come back, and reply
+threads, some of them deep. The same options and seed give the same data.
+It goes in through the importers, so it costs what a real import does.
+"""
+import datetime
+import random
+
+from django.db.models import Max
+from django.utils import timezone
+
+from chat.importer import import_messages
+from chat.models import ChatMessage
+from .importer import import_triples
+from .models import Triple, lookup_semantics, semantic_levels
+
+
+WORDS = (
+    "the a to and of it that in for on with this was but not just what like "
+    "about so be have do we you I they lunch meeting deploy bug review coffee "
+    "tomorrow later today maybe think know need fix ship test build call link "
+    "idea plan note read write look again done soon weekend"
+).split()
+EXTRAS = ("HILY", "HGWILY", "todo:", "TODO", "?", "!")
+
+
+class Dataset(object):
+    def __init__(self, messages=1000, users=5, tags=8, churn=4, thread_depth=20, days=30, seed=0, end=None):
+        self.count = messages
+        self.usernames = ["synthetic%d" % n for n in range(users)]
+        self.tag_count = tags
+        self.churn = churn
+        self.thread_depth = thread_depth
+        self.span = days * 24 * 60 * 60
+        self.seed = seed
+        self.end = end or timezone.now()
+        self.base = (ChatMessage.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+        self.semantics = {}
+        self.bootstrap = []
+        for level in semantic_levels():
+            for name in level:
+                existing = Triple.lookup_semantic(name)
+                if existing is None:
+                    self.semantics[name] = self.base + len(self.bootstrap)
+                    self.bootstrap.append(name)
+                else:
+                    self.semantics[name] = existing.pk
+        self.tags = range(self.base + len(self.bootstrap), self.base + len(self.bootstrap) + tags)
+
+    def random(self, n, stream):
+        return random.Random(self.seed * 1000003 + n * 4 + stream)
+
+    def message_pk(self, n):
+        return self.tags[-1] + 1 + n if self.tags else self.base + len(self.bootstrap) + n
+
+    def timestamp(self, n):
+        return self.end - datetime.timedelta(seconds=self.span * float(self.count - n) / max(self.count, 1))
+
+    def author(self, rng):
+        return rng.choice(self.usernames)
+
+    def record(self, pk, body, author, timestamp):
+        return {"pk": pk, "body": body, "author": author, "timestamp": timestamp.isoformat()}
+
+    def messages(self):
+        """
+        Export-format rows: the semantic and tag messages, then the chat itself.
+        """
+        start = self.end - datetime.timedelta(seconds=self.span + 60)
+        for name in self.bootstrap:
+            yield self.record(self.semantics[name], name, self.usernames[0], start)
+        for (n, pk) in enumerate(self.tags):
+            yield self.record(pk, "tag %d" % n, self.usernames[0], start)
+        for n in range(self.count):
+            rng = self.random(n, 0)
+            words = [rng.choice(WORDS) for _ in range(rng.randint(3, 20))]
+            if rng.random() < 0.1: words.append(rng.choice(EXTRAS))
+            yield self.record(self.message_pk(n), " ".join(words), self.author(rng), self.timestamp(n))
+
+    def edge(self, source, path, destination, author, timestamp):
+        return {
+            "source": source,
+            "path": path,
+            "destination": destination,
+            "author": author,
+            "timestamp": min(timestamp, self.end).isoformat(),
+        }
+
+    def triples(self):
+        """
+        Feed-format rows: the semantic graph, the tags, then each message's history.
+        """
+        start = self.end - datetime.timedelta(seconds=self.span + 60)
+        for name in self.bootstrap:
+            source_name, path_name = lookup_semantics[name]
+            yield self.edge(
+                self.semantics.get(source_name),
+                self.semantics.get(path_name),
+                self.semantics[name],
+                self.usernames[0],
+                start,
+            )
+        tag = self.semantics["tag"]
+        for pk in self.tags:
+            yield self.edge(tag, pk, tag, self.usernames[0], start)
+        for n in range(self.count):
+            for row in self.history(n):
+                yield row
+
+    def history(self, n):
+        rng = self.random(n, 1)
+        pk = self.message_pk(n)
+        moment = self.timestamp(n)
+        later = lambda: moment + datetime.timedelta(minutes=rng.randint(1, 60 * 24))
+        block = max(self.thread_depth, 1) * 10
+        if 0 < n % block < self.thread_depth:
+            yield self.edge(self.semantics["reply"], pk, self.message_pk(n - 1), self.author(rng), moment)
+        elif n and rng.random() < 0.15:
+            parent = self.message_pk(n - rng.randint(1, min(n, 50)))
+            yield self.edge(self.semantics["reply"], pk, parent, self.author(rng), moment)
+        if self.tags and rng.random() < 0.6:
+            steps = sorted(later() for _ in range(rng.randint(1, max(self.churn, 1))))
+            for step in steps:
+                destination = None if rng.random() < 0.15 else rng.choice(self.tags)
+                yield self.edge(self.semantics["tag"], pk, destination, self.author(rng), step)
+        if rng.random() < 0.05:
+            hidden = later()
+            yield self.edge(self.semantics["hide"], pk, self.semantics["hide"], self.author(rng), hidden)
+            if rng.random() < 0.3:
+                yield self.edge(self.semantics["hide"], pk, None, self.author(rng), hidden + datetime.timedelta(hours=1))
+        if rng.random() < 0.01:
+            pinned = later()
+            yield self.edge(self.semantics["sticky"], pk, pk, self.author(rng), pinned)
+            if rng.random() < 0.5:
+                yield self.edge(self.semantics["sticky"], pk, None, self.author(rng), pinned + datetime.timedelta(days=1))
+
+
+def generate(batch_size=1000, report=None, **options):
+    """
+    Adds a Dataset built from options to the database. Returns the Dataset.
+    """
+    dataset = Dataset(**options)
+    import_messages(dataset.messages(), batch_size, create_authors=True, report=report)
+    import_triples(dataset.triples(), batch_size, create_authors=True, report=report)
+    return dataset
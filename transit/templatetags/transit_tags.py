@@ -0,0 +1,24 @@
+from django import template
+
+from transit.models import Triple, TagCount, TagMembership
+
+
+register = template.Library()
+
+
+@register.inclusion_tag("transit/tag/_tag_cloud.html")
+def tag_cloud(user=None):
+    """
+    The current tags with how many messages have each; only those user gave, if given.
+    """
+    tags = Triple.get_tags() or []
+    if user is None:
+        counts = dict(TagCount.objects.filter(tag__in=tags).values_list("tag", "count"))
+    else:
+        counts = TagMembership.objects.counts_for(user)
+    cloud = []
+    for tag in tags:
+        if counts.get(tag.pk):
+            tag.tagged_count = counts[tag.pk]
+            cloud.append(tag)
+    return {"tags": cloud}
@@ -0,0 +1,148 @@
+import datetime
+import random
+
+from django.db.models import Max
+from django.test import TestCase
+from django.utils import timezone
+
+from chat.models import ChatMessage
+from .importer import import_triples
+from .models import (
+    CurrentEdge, EdgeInterval, TaggingQueueEntry, TagCount, TagMembership, Triple, ThreadLink,
+    lookup_semantics, rebuild_indexes, semantic_levels,
+)
+
+
+class GraphTestCase(TestCase):
+    """
+    Starts from the bootstrapped semantic graph, one message per name.
+    """
+    def setUp(self):
+        self.start = timezone.now() - datetime.timedelta(days=1)
+        self.count = 0
+        self.semantics = {}
+        for level in semantic_levels():
+            for name in level:
+                self.semantics[name] = self.message(name)
+                Triple.set_semantic(name, self.semantics[name])
+
+    def message(self, body):
+        message = ChatMessage.objects.create(body=body)
+        # a minute apart, so that creation order is timestamp order
+        self.count += 1
+        message.timestamp = self.start + datetime.timedelta(minutes=self.count)
+        ChatMessage.objects.filter(pk=message.pk).update(timestamp=message.timestamp)
+        return message
+
+    def reply(self, child, parent):
+        return Triple(source=self.semantics["reply"], path=child, destination=parent)
+
+    def derived(self):
+        return [
+            sorted(CurrentEdge.objects.values_list("source", "path", "destination", "author", "per_author", "timestamp")),
+            sorted(EdgeInterval.objects.values_list("source", "path", "destination", "author", "valid_from", "valid_to")),
+            sorted(TaggingQueueEntry.objects.values_list("message", "timestamp")),
+            sorted(TagMembership.objects.values_list("message", "tag", "author", "timestamp")),
+            sorted(TagCount.objects.filter(count__gt=0).values_list("tag", "count")),
+            sorted(ThreadLink.objects.values_list("ancestor", "descendant", "depth")),
+        ]
+
+    def assertRebuilt(self):
+        """
+        The tables as the writes so far left them are what rebuilding them gives.
+        """
+        kept = self.derived()
+        list(rebuild_indexes())
+        self.assertEqual(kept, self.derived())
+
+
+class ThreadTest(GraphTestCase):
+    def links(self):
+        return sorted(ThreadLink.objects.values_list("ancestor", "descendant", "depth"))
+
+    def test_thread_reads_each_branch_through(self):
+        root = self.message("root")
+        first = self.message("first")
+        second = self.message("second")
+        first_reply = self.message("first reply")
+        second_reply = self.message("second reply")
+        late_first_reply = self.message("late first reply")
+        for (child, parent) in (
+            (first, root),
+            (second, root),
+            (first_reply, first),
+            (second_reply, second),
+            (late_first_reply, first),
+        ):
+            self.reply(child, parent).save()
+        expected = [
+            (root.pk, 0),
+            (first.pk, 1),
+            (first_reply.pk, 2),
+            (late_first_reply.pk, 2),
+            (second.pk, 1),
+            (second_reply.pk, 2),
+        ]
+        self.assertEqual(ThreadLink.objects.thread(root), expected)
+        self.assertEqual(ThreadLink.objects.thread(root, max_depth=1), [(root.pk, 0), (first.pk, 1), (second.pk, 1)])
+
+    def test_rebuild_refuses_reply_loops_as_attach_does(self):
+        question = self.message("question")
+        answer = self.message("answer")
+        Triple.objects.record([self.reply(question, answer), self.reply(answer, question)])
+        attached = self.links()
+        self.assertNotIn((question.pk, answer.pk, 1), attached)
+        ThreadLink.objects.rebuild()
+        self.assertEqual(self.links(), attached)
+
+
+class RebindTest(GraphTestCase):
+    """
+    Moving a semantic name to another message changes which edges every
+    derived table should follow, not just the edge that moved it.
+    """
+    def setUp(self):
+        super(RebindTest, self).setUp()
+        tag = self.semantics["tag"]
+        self.tags = [self.message("tag %d" % n) for n in range(2)]
+        for label in self.tags:
+            Triple(source=tag, path=label, destination=tag).save()
+        self.messages = [self.message("message %d" % n) for n in range(6)]
+        for (n, message) in enumerate(self.messages[:4]):
+            Triple(source=tag, path=message, destination=self.tags[n % 2]).save()
+        self.reply(self.messages[5], self.messages[4]).save()
+
+    def test_set_semantic(self):
+        self.assertTrue(TagMembership.objects.exists())
+        Triple.set_semantic("tag", self.message("another tag"))
+        self.assertFalse(TagMembership.objects.exists())
+        self.assertRebuilt()
+
+    def test_record(self):
+        (source_name, path_name) = lookup_semantics["reply"]
+        Triple.objects.record([
+            Triple(source=self.semantics.get(source_name), path=self.semantics.get(path_name), destination=self.message("another reply")),
+        ])
+        self.assertFalse(ThreadLink.objects.filter(depth__gt=0).exists())
+        self.assertRebuilt()
+
+
+class ImportTest(GraphTestCase):
+    def test_tied_timestamps_go_by_pk(self):
+        tag = self.semantics["tag"]
+        labels = [self.message("tag %d" % n) for n in range(3)]
+        for label in labels:
+            Triple(source=tag, path=label, destination=tag).save()
+        messages = [self.message("message %d" % n) for n in range(4)]
+        moment = timezone.now().isoformat()
+        pk = Triple.objects.aggregate(last=Max("pk"))["last"]
+        records = []
+        for message in messages:
+            for label in labels:
+                pk += 1
+                records.append({"pk": pk, "source": tag.pk, "path": message.pk, "destination": label.pk, "timestamp": moment})
+        random.Random(0).shuffle(records)
+        import_triples(records)
+        heads = CurrentEdge.objects.filter(source=tag, path__in=messages, per_author=False)
+        self.assertEqual(dict(heads.values_list("path", "destination")), dict.fromkeys([m.pk for m in messages], labels[-1].pk))
+        self.assertRebuilt()
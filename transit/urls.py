@@ -5,10 +5,14 @@ from .views import (
     TodayView as Today,
     UnmetSemanticsView,
     CreateFromThreeMessagesView,
+    TripleBatchView,
     UntaggedMessagesView,
     TaggedMessagesView,
     ChatMessageDetailView,
     ReplyView,
+    ThreadView,
+    FeedView,
+    ImportView,
 )
 
 admin.autodiscover()
@@ -36,6 +40,13 @@ urlpatterns = patterns(
         ),
         name="create_from_three_messages",
     ),
+    url(
+        r'^triple/batch/$',
+        login_required(
+            TripleBatchView.as_view()
+        ),
+        name="triple_batch",
+    ),
     url(
         r'^message/untagged/list/$',
         login_required(
@@ -64,4 +75,25 @@ urlpatterns = patterns(
         ),
         name="reply",
     ),
+    url(
+        r'^message/(?P<pk>\d+)/thread/$',
+        login_required(
+            ThreadView.as_view()
+        ),
+        name="thread",
+    ),
+    url(
+        r'^feed/$',
+        login_required(
+            FeedView.as_view()
+        ),
+        name="feed",
+    ),
+    url(
+        r'^import/$',
+        login_required(
+            ImportView.as_view()
+        ),
+        name="import_history",
+    ),
 )
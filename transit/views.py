@@ -1,16 +1,26 @@
 # python imports
 import datetime
+import json
 
 # django imports
-from django.db.models import Q
 from django.views.generic import (
     CreateView,
     DetailView,
     ListView,
+    View,
 )
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, Http404
+from django.utils import timezone
+from django.conf import settings
 from django.forms import HiddenInput
 from django.shortcuts import (
     get_object_or_404,
+    redirect,
+)
+from django.core.paginator import (
+    EmptyPage,
+    PageNotAnInteger,
+    Paginator,
 )
 from django.core.urlresolvers import (
     reverse_lazy,
@@ -22,9 +32,24 @@ from django.core.urlresolvers import (
 from .models import (
     lookup_semantics,
     Triple,
+    CurrentEdge,
+    ThreadLink,
+    TaggingQueueEntry,
+    TagMembership,
+    TagCount,
+    EdgeInterval,
+    LIVE_SEMANTICS,
 )
+from .neighborhood import Neighborhood
+from . import feed
+from . import fragments
+from .importer import import_triples
+from chat import importer
 from chat.models import ChatMessage
-from chat.views import PageTitleMixin, MessageListView
+from chat.views import PageTitleMixin, MessageListView, parse_moment
+from chat.conditional import WatermarkMixin
+from chat.versions import LOG
+from .caching import GRAPH
 
 # this app's imports
 
@@ -96,36 +121,26 @@ class CreateFromThreeMessagesView(PageTitleMixin, CreateView):
 
 class UnmetSemanticsView(MessageListView):
     template_name = "transit/unmet_semantics.html"
+    watermark_versions = (LOG, GRAPH)
 
     def get_candidates(self):
-        def filter_step(name):
-            if Triple.lookup_semantic(name) is not None: return False
-            source_name, path_name = lookup_semantics[name][0:2]
-            if source_name is not None:
-                if Triple.lookup_semantic(source_name) is None:
-                    return False
-            if path_name is not None:
-                if Triple.lookup_semantic(path_name) is None:
-                    return False
-            return True
+        resolved, fringe = Triple.warm_semantic_cache()
         def map_step(name):
-            source_name, path_name = lookup_semantics[name][0:2]
+            source_name, path_name = lookup_semantics[name]
             source = {
                 "name": source_name,
-                "value": Triple.lookup_semantic(source_name),
+                "value": resolved.get(source_name),
             }
             path = {
                 "name": path_name,
-                "value": Triple.lookup_semantic(path_name),
+                "value": resolved.get(path_name),
             }
             return {
                 "name": name,
                 "source": source,
                 "path": path,
             }
-        names = lookup_semantics.keys()
-        return map(map_step, filter(filter_step, names))
-
+        return map(map_step, fringe)
 
     def get_context_data(self, *args, **kwargs):
         context = super(UnmetSemanticsView, self).get_context_data(*args, **kwargs)
@@ -133,26 +148,192 @@ class UnmetSemanticsView(MessageListView):
         return context
 
 
-class UntaggedMessagesView(MessageListView):
+class AsOfMixin(object):
+    """
+    ?as_of=<date or datetime> shows the edges as they were at that moment.
+    """
+    @cache_getter("as_of")
+    def get_as_of(self):
+        try:
+            return parse_moment(self.request.GET.get("as_of"), "as_of")
+        except ValueError:
+            raise Http404("Invalid as_of.")
+
+    def get_context_data(self, *args, **kwargs):
+        context = super(AsOfMixin, self).get_context_data(*args, **kwargs)
+        context["as_of"] = self.get_as_of()
+        return context
+
+
+class CachedPreviewsMixin(object):
+    """
+    For views whose templates show transit/_cached_message_preview.html:
+    with cache_previews on, the previews come from the fragment cache.
+    Left at None, it follows settings.CACHE_PREVIEWS.
+    """
+    cache_previews = None
+
+    def get_cache_previews(self):
+        if self.cache_previews is None:
+            return getattr(settings, "CACHE_PREVIEWS", False)
+        return self.cache_previews
+
+    def get_preview_messages(self, context):
+        return context["object_list"]
+
+    def render_to_response(self, context, **kwargs):
+        if self.get_cache_previews():
+            fragments.render_previews(self.get_preview_messages(context), dict(context, user=self.request.user))
+        return super(CachedPreviewsMixin, self).render_to_response(context, **kwargs)
+
+
+class LiveUpdatesMixin(object):
+    """
+    Lets the page's list follow the live update service, when there is one:
+    new messages get added, and messages that the removing_events take away
+    from the list get removed.
+    """
+    live_events = ("message",)
+    removing_events = ()
+    newest_first = True
+
+    def get_context_data(self, *args, **kwargs):
+        context = super(LiveUpdatesMixin, self).get_context_data(*args, **kwargs)
+        url = getattr(settings, "LIVE_EVENTS_URL", None)
+        if url:
+            context["live_events_url"] = "%s?only=%s" % (url, ",".join(self.live_events))
+            context["live_events"] = json.dumps(self.live_events)
+            context["removing_events"] = json.dumps(self.removing_events)
+            context["newest_first"] = json.dumps(self.newest_first)
+            context["live_cursor"] = str(feed.head())
+        return context
+
+
+class IndexedMessagesMixin(object):
+    """
+    For MessageListViews paging an index table keyed by message, with the
+    message's timestamp copied in; lists the rows' messages.
+    """
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, rows, is_paginated = super(IndexedMessagesMixin, self).paginate_queryset(queryset, page_size)
+        messages = [row.message for row in rows]
+        page.object_list = messages
+        return (paginator, page, messages, is_paginated)
+
+
+class TripleBatchView(View):
+    """
+    Creates many triples in one go, all by the requesting user.
+    Takes either a JSON body, {"triples": [[source, path, destination], ...]},
+    answered with JSON, or a form with source, destination and any number of
+    path fields (one triple per path), redirected to ?next=.
+    0 or null stands for no message.
+    """
+    max_triples = 1000
+
+    def post(self, request, *args, **kwargs):
+        try:
+            keys = self.get_keys()
+        except (ValueError, TypeError, KeyError) as e:
+            return HttpResponseBadRequest("Malformed triples: %s" % e, content_type="text/plain")
+        if len(keys) > self.max_triples:
+            return HttpResponseBadRequest("At most %d triples at a time" % self.max_triples, content_type="text/plain")
+        pks = set(pk for key in keys for pk in key if pk is not None)
+        missing = pks - set(ChatMessage.objects.filter(pk__in=pks).values_list("pk", flat=True))
+        if missing:
+            return HttpResponseBadRequest(
+                "No such messages: %s" % ", ".join(map(str, sorted(missing))),
+                content_type="text/plain",
+            )
+        triples = Triple.objects.record(
+            Triple(source_id=source, path_id=path, destination_id=destination, author_id=request.user.pk)
+            for (source, path, destination)
+            in keys
+        )
+        if not self.is_json():
+            return redirect(request.GET.get("next") or "untagged_messages")
+        return HttpResponse(
+            json.dumps({"created": len(triples)}),
+            content_type="application/json",
+        )
+
+    def is_json(self):
+        return self.request.META.get("CONTENT_TYPE", "").startswith("application/json")
+
+    def get_keys(self):
+        """
+        The requested (source_pk, path_pk, destination_pk) tuples, in order.
+        """
+        def pk(value):
+            if value is None: return None
+            return int(value) or None
+        if self.is_json():
+            rows = json.loads(self.request.body)["triples"]
+            if any(len(row) != 3 for row in rows):
+                raise ValueError("each triple needs a source, path and destination")
+            return [tuple(map(pk, row)) for row in rows]
+        data = self.request.POST
+        source, destination = pk(data.get("source")), pk(data.get("destination"))
+        return [(source, pk(path), destination) for path in data.getlist("path")]
+
+
+class ImportView(View):
+    """
+    import_history over HTTP, for staff: a multipart POST with a messages file
+    in the export format and optionally a triples file, answered with what was
+    imported as JSON. Files ending in .gz are gunzipped.
+    """
+    batch_size = 1000
+
+    def post(self, request, *args, **kwargs):
+        if not request.user.is_staff:
+            return HttpResponseForbidden("Only staff can import.", content_type="text/plain")
+        if "messages" not in request.FILES:
+            return HttpResponseBadRequest("Upload a messages file.", content_type="text/plain")
+        create_authors = bool(request.POST.get("create_authors"))
+        result = {}
+        try:
+            result["messages"] = importer.import_messages(
+                self.records(request.FILES["messages"]),
+                self.batch_size,
+                create_authors,
+            ).as_dict()
+            if "triples" in request.FILES:
+                result["triples"] = import_triples(
+                    self.records(request.FILES["triples"]),
+                    self.batch_size,
+                    create_authors,
+                ).as_dict()
+        except (ValueError, KeyError) as e:
+            # earlier batches stay imported; sending the same files again resumes
+            result["error"] = unicode(e)
+            return HttpResponseBadRequest(json.dumps(result), content_type="application/json")
+        return HttpResponse(json.dumps(result), content_type="application/json")
+
+    def records(self, upload):
+        format = self.request.POST.get("format") or importer.format_for(upload.name)
+        if format not in importer.FORMATS: raise ValueError("unknown format: %s" % format)
+        return importer.FORMATS[format](importer.upload_lines(upload))
+
+
+class UntaggedMessagesView(CachedPreviewsMixin, LiveUpdatesMixin, IndexedMessagesMixin, MessageListView):
     template_name="transit/untagged_messages.html"
+    keyset_descending = False
+    live_events = ("message", "tag")
+    removing_events = ("tag",)
+    newest_first = False
+    watermark_versions = (LOG, GRAPH)
     def get_queryset(self):
-        qs = super(UntaggedMessagesView, self).get_queryset()
-        tag = Triple.lookup_semantic("tag")
-        if tag is None: return qs
-        tags = Triple.get_tags()
-        taggings = Triple.objects.filter(source=tag)
-        tagged = taggings.values("path")
-        tag_removed = taggings.filter(destination=None).values("path")
-        query = Q(pk__in=tag_removed)|~Q(pk__in=tagged)
-        candidates = qs.filter(query)
-        return candidates.order_by("timestamp")
+        entries = TaggingQueueEntry.objects.select_related("message__author")
+        return entries.order_by("timestamp", "message")
 
     @classmethod
     def annotate_objects(cls, object_list):
         tag = Triple.lookup_semantic("tag")
         if tag is None: return
+        current = Triple.objects.current_values((tag, message) for message in object_list)
         for message in object_list:
-            message.tag = Triple.lookup(tag, message)
+            message.tag = current[(tag.pk, message.pk)]
 
     def get_context_data(self, *args, **kwargs):
         context = super(UntaggedMessagesView, self).get_context_data(*args, **kwargs)
@@ -162,73 +343,110 @@ class UntaggedMessagesView(MessageListView):
         return context
 
 
-class TaggedMessagesView(DetailView):
-    model = ChatMessage
+class TaggedMessagesView(IndexedMessagesMixin, MessageListView):
     template_name = "transit/tag/tagged_messages.html"
-    def get_tagged_messages(self):
-        tag = self.get_object()
-        tag_tag = Triple.lookup_semantic("tag")
-        potential_edges = tag.destination_set
-        if not tag_tag: return [e.path for e in potential_edges]
-        edges = potential_edges.filter(source=tag_tag)
-        return self.model.objects.filter(pk__in=edges.values_list("path", flat=True))
+    watermark_versions = (LOG, GRAPH)
+
+    @cache_getter("tag")
+    def get_tag(self):
+        return get_object_or_404(ChatMessage, pk=self.kwargs["pk"])
+
+    def get_page_title(self):
+        return 'Messages tagged "%s"' % self.get_tag().get_body_preview()
+
+    def get_queryset(self):
+        members = TagMembership.objects.filter(tag=self.get_tag()).select_related("message__author")
+        return members.order_by("-timestamp", "-message")
 
     def get_context_data(self, *args, **kwargs):
         context = super(TaggedMessagesView, self).get_context_data(*args, **kwargs)
-        context["object_list"] = self.get_tagged_messages()
+        context["object"] = self.get_tag()
+        count = TagCount.objects.filter(tag=self.get_tag()).values_list("count", flat=True)
+        context["tagged_count"] = count[0] if count else 0
         return context
 
 
-class TodayView(PageTitleMixin, ListView):
+class TodayView(WatermarkMixin, CachedPreviewsMixin, LiveUpdatesMixin, AsOfMixin, PageTitleMixin, ListView):
     model = ChatMessage
     page_title = "Today's messages"
     template_name = "transit/today.html"
+    watermark_versions = (LOG, GRAPH)
+    live_events = ("message",) + LIVE_SEMANTICS
+    removing_events = ("hide",)
+
+    def get_watermark_extra(self):
+        # "today" moves at midnight without anything being written
+        return (datetime.date.today(),)
 
     def get_sticky_messages(self):
         sticky = Triple.lookup_semantic("sticky")
         if sticky is None:
             return []
-        stickings = sticky.source_set.all()
-        stickers = (edge.path for edge in stickings if edge.current_value() is not None)
-        result = self.model.objects.filter(pk__in=set(sticker.pk for sticker in stickers))
-        return result.order_by("timestamp")
-
-    def enhance_message(self, message):
-        hidden = Triple.lookup_semantic("hide")
-        if hidden is not None:
-            message.hide = Triple.lookup(hidden, message)
-
-        sticky = Triple.lookup_semantic("sticky")
-        if sticky is not None:
-            message.sticky = Triple.lookup(sticky, message)
-
-        reply = Triple.lookup_semantic("reply")
-        if reply is not None:
-            message.parent = Triple.lookup(reply, message)
-
-        tag = Triple.lookup_semantic("tag")
-        if tag is not None:
-            message.tag = Triple.lookup(tag, message)
-            reply_tag = Triple.lookup_semantic("reply tag")
-            if reply_tag is not None and message.tag is not None:
+        if self.get_as_of() is None:
+            pins = CurrentEdge.objects.held_by(sticky)
+        else:
+            pins = EdgeInterval.objects.at(self.get_as_of()).filter(source=sticky).exclude(path=None)
+        pins = pins.select_related("path__author")
+        return [pin.path for pin in pins.order_by("path__timestamp")]
+
+    def enhance_messages(self, messages):
+        """
+        Annotates hide, sticky, parent and tag onto each message
+        with a single bulk lookup for the whole list.
+        """
+        messages = list(messages)
+        semantics = dict(
+            (attribute, Triple.lookup_semantic(name))
+            for (attribute, name)
+            in (
+                ("hide", "hide"),
+                ("sticky", "sticky"),
+                ("parent", "reply"),
+                ("tag", "tag"),
+            )
+        )
+        semantics = dict((k, v) for (k, v) in semantics.items() if v is not None)
+        current = Triple.objects.current_values(
+            (
+                (semantic, message)
+                for semantic in semantics.values()
+                for message in messages
+            ),
+            as_of=self.get_as_of(),
+        )
+        reply_tag = Triple.lookup_semantic("reply tag")
+        if self.get_as_of() is None: # the thread index only knows the present
+            reply_counts = ThreadLink.objects.descendant_counts(messages)
+        else:
+            reply_counts = dict.fromkeys((message.pk for message in messages), None)
+        for message in messages:
+            message.reply_count = reply_counts[message.pk]
+            for (attribute, semantic) in semantics.items():
+                setattr(message, attribute, current[(semantic.pk, message.pk)])
+            if reply_tag is not None and getattr(message, "tag", None) is not None:
                 if reply_tag.pk == message.tag.pk:
-                    if message.parent:
+                    if getattr(message, "parent", None):
                         message.tag = {
                             "pk": message.tag.pk,
                             "get_body_preview": "a reply",
                         }
-        return message
+        return messages
 
     def get_queryset(self):
         qs = super(TodayView, self).get_queryset()
-        today = datetime.date.today()
+        as_of = self.get_as_of()
+        today = datetime.date.today() if as_of is None else timezone.localtime(as_of).date()
         yesterday = today - datetime.timedelta(1)
         yesterday_midnight = datetime.datetime.fromordinal(yesterday.toordinal()) # there must be a better way
         result = qs.filter(timestamp__gte=yesterday_midnight)
-        result = result.order_by("-timestamp")
-        result = (self.enhance_message(message) for message in result)
+        if as_of is not None:
+            result = result.filter(timestamp__lte=as_of)
+        result = result.select_related("author").order_by("-timestamp")
         return result
 
+    def get_preview_messages(self, context):
+        return context["sticky_posts"] + context["object_list"]
+
     def get_context_data(self, *args, **kwargs):
         context = super(TodayView, self).get_context_data(*args, **kwargs)
         hidden = Triple.lookup_semantic("hide")
@@ -236,98 +454,56 @@ class TodayView(PageTitleMixin, ListView):
         context["this_page"] = self.request.path
         stick = Triple.lookup_semantic("sticky")
         context["sticky_pk"] = stick.pk if stick else None
-        context["sticky_posts"] = (self.enhance_message(post) for post in self.get_sticky_messages())
-        # force the generator so that I can reuse its results
+        context["sticky_posts"] = self.get_sticky_messages()
         context["object_list"] = list(context["object_list"])
+        self.enhance_messages(context["sticky_posts"] + context["object_list"])
+        if context["as_of"] is not None:
+            context.pop("live_events_url", None) # the past doesn't change
         return context
 
 
-class ChatMessageDetailView(PageTitleMixin, DetailView):
+class ChatMessageDetailView(WatermarkMixin, CachedPreviewsMixin, AsOfMixin, PageTitleMixin, DetailView):
     model = ChatMessage
     page_title = 'Message details (transit)'
     template_name = "transit/message_detail.html"
+    watermark_versions = (LOG, GRAPH)
 
-    def get_sources(self):
-        candidates = self.get_object().source_set.all()
-        paths = set(
-            [
-                trip.path.pk if trip.path is not None else 0
-                for trip
-                in candidates
-            ]
-        )
-        representatives = [
-            [
-                trip
-                for trip
-                in candidates
-                if (trip.path is not None and trip.path.pk == pk)
-                or (trip.path is None and pk == 0)
-            ][0]
-            for pk
-            in paths
-        ]
-        return [
-            {
-                "source": t.source, # should be self.get_object()
-                "path": t.path,
-                "destination": t.current_value(),
-            }
-            for t
-            in representatives
-        ]
+    page_params = (
+        ("sources", "source"),
+        ("paths", "path"),
+        ("destinations", "destination"),
+    )
 
-    def get_paths(self):
-        candidates = self.get_object().path_set.all()
-        sources = set(
-            [
-                trip.source.pk if trip.source is not None else 0
-                for trip
-                in candidates
-            ]
-        )
-        representatives = [
-            [
-                trip
-                for trip
-                in candidates
-                if (trip.source is not None and trip.source.pk == pk)
-                or (trip.source is None and pk == 0)
-            ][0]
-            for pk
-            in sources
-        ]
+    def get_preview_messages(self, context):
         return [
-            {
-                "source": t.source,
-                "path": t.path, # should be self.get_object()
-                "destination": t.current_value(),
-            }
-            for t
-            in representatives
+            getattr(edge, other)
+            for (name, role) in self.page_params
+            for edge in context[name]
+            for other in ("source", "path", "destination")
+            if other != role
         ]
 
-    def get_destinations(self):
-        ob = self.get_object()
-        candidates = ob.destination_set.all()
-        return [
-            edge
-            for edge
-            in candidates
-            if (
-                lambda d: d is not None and d.pk == ob.pk
-            )(edge.current_value())
-        ]
+    def get_page_query(self, param, number):
+        query = self.request.GET.copy()
+        query[param] = number
+        return query.urlencode()
 
     def get_context_data(self, *args, **kwargs):
         context = super(ChatMessageDetailView, self).get_context_data(*args, **kwargs)
-        context["sources"] = self.get_sources()
-        context["paths"] = self.get_paths()
-        context["destinations"] = self.get_destinations()
+        neighborhood = Neighborhood(self.object, as_of=self.get_as_of())
+        for (name, role) in self.page_params:
+            param = "%s_page" % name
+            page = neighborhood.page(role, self.request.GET.get(param, 1))
+            context[name] = page.object_list
+            context[param] = page
+            if page.has_previous():
+                context["%s_previous" % param] = self.get_page_query(param, page.previous_page_number())
+            if page.has_next():
+                context["%s_next" % param] = self.get_page_query(param, page.next_page_number())
         return context
 
 
-class ReplyView(PageTitleMixin, CreateView):
+class ReplyView(CachedPreviewsMixin, PageTitleMixin, CreateView):
     model = ChatMessage
     template_name = "transit/reply.html"
 
@@ -343,10 +519,9 @@ class ReplyView(PageTitleMixin, CreateView):
         parent = self.get_parent()
         reply = Triple.lookup_semantic("reply")
         if reply is None: return []
-        destinations = [(trip, trip.current_value()) for trip in parent.destination_set.all()]
-        destinations = [t for (t, d) in destinations if d is not None and d.pk == parent.pk]
-        paths = [trip.path for trip in destinations if trip.source is not None and trip.source.pk == reply.pk]
-        return self.model.objects.filter(pk__in=set(path.pk for path in paths if path is not None)).order_by("-timestamp")
+        replies = CurrentEdge.objects.pointing_at(parent, reply).values("path")
+        siblings = self.model.objects.filter(pk__in=replies)
+        return siblings.select_related("author").order_by("-timestamp")
 
     def form_valid(self, form):
         reply = Triple.lookup_semantic("reply")
@@ -363,8 +538,104 @@ class ReplyView(PageTitleMixin, CreateView):
         tag_edge.save()
         return response
 
+    def get_preview_messages(self, context):
+        return [context["parent"]] + list(context["object_list"])
+
     def get_context_data(self, *args, **kwargs):
         context = super(ReplyView, self).get_context_data(*args, **kwargs)
         context["parent"] = self.get_parent()
         context["object_list"] = self.get_siblings()
         return context
+
+
+class ThreadView(CachedPreviewsMixin, PageTitleMixin, DetailView):
+    model = ChatMessage
+    template_name = "transit/thread.html"
+    paginate_by = 50
+    max_depth = 20
+
+    def get_page_title(self):
+        return 'Thread of "%s"' % self.object.get_body_preview()
+
+    def get_depth(self):
+        try:
+            return min(self.max_depth, max(0, int(self.request.GET.get("depth", self.max_depth))))
+        except ValueError:
+            return self.max_depth
+
+    def get_page_query(self, number):
+        query = self.request.GET.copy()
+        query["page"] = number
+        return query.urlencode()
+
+    def get_preview_messages(self, context):
+        return context["ancestors"] + context["object_list"]
+
+    def get_context_data(self, *args, **kwargs):
+        context = super(ThreadView, self).get_context_data(*args, **kwargs)
+        ancestors = ThreadLink.objects.ancestor_chains([self.object])[self.object.pk]
+        root = ancestors[0] if ancestors else self.object
+        paginator = Paginator(ThreadLink.objects.thread(root, self.get_depth()), self.paginate_by)
+        try:
+            page = paginator.page(self.request.GET.get("page", 1))
+        except PageNotAnInteger:
+            page = paginator.page(1)
+        except EmptyPage:
+            page = paginator.page(paginator.num_pages)
+        loaded = self.model.objects.select_related("author").in_bulk([pk for (pk, depth) in page.object_list])
+        messages = []
+        for (pk, depth) in page.object_list:
+            message = loaded[pk]
+            message.depth = depth
+            message.indent = 2 * depth
+            messages.append(message)
+        by_pk = dict((message.pk, message) for message in messages)
+        by_pk.update((ancestor.pk, ancestor) for ancestor in ancestors)
+        parents = ThreadLink.objects.parents(messages)
+        reply_counts = ThreadLink.objects.descendant_counts(messages)
+        for message in messages:
+            message.parent = by_pk.get(parents.get(message.pk))
+            message.reply_count = reply_counts[message.pk]
+        context["root"] = root
+        context["ancestors"] = ancestors
+        context["object_list"] = messages
+        context["page"] = page
+        if page.has_previous():
+            context["previous_query"] = self.get_page_query(page.previous_page_number())
+        if page.has_next():
+            context["next_query"] = self.get_page_query(page.next_page_number())
+        return context
+
+
+class FeedView(View):
+    """
+    Messages and triples created after ?cursor=, as JSON, with the cursor to
+    send next time; without a cursor, just a cursor for now.
+    ?wait=N holds the request for up to N seconds until there is something.
+    """
+    max_wait = 30
+    page_size = 100
+
+    def get(self, request, *args, **kwargs):
+        token = request.GET.get("cursor")
+        if not token:
+            return self.render(feed.head(), [], [])
+        try:
+            cursor = feed.parse_cursor(token)
+            wait = min(self.max_wait, float(request.GET.get("wait", 0)))
+        except ValueError as e:
+            return HttpResponseBadRequest(unicode(e), content_type="text/plain")
+        if wait > 0:
+            feed.wait(cursor, wait)
+        messages, triples, cursor = feed.changes(cursor, self.page_size)
+        return self.render(cursor, messages, triples)
+
+    def render(self, cursor, messages, triples):
+        content = json.dumps({
+            "cursor": str(cursor),
+            "messages": messages,
+            "triples": triples,
+        })
+        response = HttpResponse(content, content_type="application/json")
+        response["Cache-Control"] = "no-cache"
+        return response